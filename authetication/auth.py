@@ -6,19 +6,35 @@ from datetime import timedelta, datetime, timezone
 from fastapi import APIRouter
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
+from sqlalchemy import update
 
 # User imports
 
 from rest_schema import *
 from utility import *
 from models import *
+from utility.ratelimit import login_limiter, register_limiter, verify_limiter
 
 auth = APIRouter()
 
 
-@auth.post("/register-user")
-async def register_user(request: UserRegister, dbs: AsyncSession = Depends(get_db)):
+# Route-level dependencies run before the handler's own, so a throttled request
+# is turned away before get_db checks out a connection. Each takes the body
+# under the handler's parameter name, which FastAPI then parses only once.
+async def throttle_register(http_request: Request, request: UserRegister):
+    await register_limiter.check(http_request, request.email)
+
+
+async def throttle_verify(request: Request):
+    await verify_limiter.check(request)
+
+
+async def throttle_login(request: Request, req: LoginSchema):
+    await login_limiter.check(request, req.email)
 
+
+@auth.post("/register-user", dependencies=[Depends(throttle_register)])
+async def register_user(request: UserRegister, dbs: AsyncSession = Depends(get_db)):
     user_exists = await db.existing_user(dbs, request.email)
     if user_exists:
         raise HTTPException(status_code=409, detail="User Already Exists")
@@ -27,7 +43,7 @@ async def register_user(request: UserRegister, dbs: AsyncSession = Depends(get_d
         return JSONResponse(status_code=401, content="Please enter Valid Email.")
 
     token = generate_token()
-    hash_pwd = hash_password(request.password)
+    hash_pwd = await hash_password(request.password)
 
     payloads = {
         # "id": uuid.uuid4(),
@@ -38,17 +54,13 @@ async def register_user(request: UserRegister, dbs: AsyncSession = Depends(get_d
         "is_verified": False,
     }
 
-    await db.create_user(dbs, payloads=payloads)
+    # queued in the same transaction as the user row, delivered by outbox_worker
+    await queue_verification_email(dbs, request.email, request.username, token)
 
-    verify_email_status = await send_verification_email(
-        request.email, request.username, token
-    )
+    if not await db.create_user(dbs, payloads=payloads):
+        raise HTTPException(status_code=409, detail="User Already Exists")
 
-    if not verify_email_status:
-        raise HTTPException(
-            status_code=500,
-            detail="Failed to Send Verification Email",
-        )
+    outbox_worker.notify_on_commit(dbs)
 
     return JSONResponse(
         status_code=201,
@@ -58,23 +70,26 @@ async def register_user(request: UserRegister, dbs: AsyncSession = Depends(get_d
     )
 
 
-@auth.post("/verify-email")
+@auth.post("/verify-email", dependencies=[Depends(throttle_verify)])
 async def verify_token(req: VerifyToken, dbs: AsyncSession = Depends(get_db)):
+    # one UPDATE finds and verifies the user; get_db commits it
     result = await dbs.execute(
-        select(User).filter(User.verification_token == req.token)
+        update(User)
+        .where(User.verification_token == req.token)
+        .values(verification_token=None, is_verified=True)
+        .returning(User.id)
+        .execution_options(synchronize_session=False)
     )
-    user = result.scalar_one_or_none()
+    user_id = result.scalar_one_or_none()
 
-    if not user:
+    if user_id is None:
         raise HTTPException(status_code=404, detail="Unauthorized Access")
 
-    # if user.verification_token != req.token:
-    #     raise HTTPException(status_code=401, detail="Invalid Token")
+    # bulk UPDATEs skip the mapper events that normally drop the cached principal
+    async def forget_principal():
+        invalidate_principal(user_id)
 
-    # Update the user verification status
-    user.verification_token = None
-    user.is_verified = True
-    await dbs.commit()
+    on_commit(dbs, forget_principal)
 
     return JSONResponse(
         status_code=200,
@@ -82,39 +97,48 @@ async def verify_token(req: VerifyToken, dbs: AsyncSession = Depends(get_db)):
     )
 
 
-async def handle_verification_process(*args):
+async def handle_verification_process(dbs: AsyncSession, *args):
 
-    verify_email_status = await send_verification_email(*args)
+    if await queue_verification_email(dbs, *args):
+        outbox_worker.notify_on_commit(dbs)
 
-    if not verify_email_status:
-        raise HTTPException(
-            status_code=500,
-            detail="Failed to Send Verification Email",
-        )
     return JSONResponse(
         status_code=202, content={"message": "Check your email to verify your account."}
     )
 
 
-@auth.post("/login")
+@auth.post("/login", dependencies=[Depends(throttle_login)])
 async def login(
-    response: Response, req: LoginSchema, dbs: AsyncSession = Depends(get_db)
+    request: Request,
+    response: Response,
+    req: LoginSchema,
+    dbs: AsyncSession = Depends(get_db),
 ):
     """
     Login endpoint:
     - If the credentials are valid, a JWT token is created (valid for 1 week)
       and set as an HTTP‑only cookie.
+    - Attempts are throttled per client IP and per email (429 + Retry-After)
+      before a DB connection is taken or any bcrypt work is done.
     """
 
     user = await db.existing_user(dbs=dbs, email=req.email, return_result=True)
 
-    if not user or not validate_password(req.password, user.password):
+    if not user:
         raise HTTPException(status_code=401, detail="Invalid Credentials")
+
+    is_valid, new_hash = await validate_password(req.password, user.password)
+    if not is_valid:
+        raise HTTPException(status_code=401, detail="Invalid Credentials")
+    if new_hash:
+        # stored hash uses deprecated settings, upgrade it transparently
+        user.password = new_hash
     if not user.is_verified:
         return await handle_verification_process(
+            dbs,
             req.email, user.username, user.verification_token
         )
-    token = generate_jwt_token(req.email)
+    token = generate_jwt_token(req.email, user.id, user.is_verified)
     response = JSONResponse(
         status_code=201, content={"user": user.username, "message": "Login Successful"}
     )
@@ -132,22 +156,32 @@ async def login(
 
 @auth.get("/me")
 async def get_me(
-    user: dict = Depends(get_current_user), dbs: AsyncSession = Depends(get_db)
+    user: dict = Depends(get_current_principal),
+    dbs: AsyncSession = Depends(get_user_read_db),
 ):
     """
     Auto-login check:
     Returns user details if the JWT cookie is valid.
     """
-    user = await db.existing_user(dbs, user["email"], return_result=True)
-    username = user.username
-    return {"authenticated": True, "user": username}
+    user = await load_principal(dbs, user["id"])
+    if not user:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    return {"authenticated": True, "user": user["username"]}
 
 
 @auth.post("/logout", status_code=status.HTTP_200_OK)
-async def logout(response: Response):
+async def logout(
+    request: Request, response: Response, dbs: AsyncSession = Depends(get_db)
+):
     """
-    Logout endpoint: Deletes the authentication cookie.
+    Logout endpoint: Deletes the authentication cookie and revokes the token,
+    so a copy of it stops working too.
     """
+    claims = read_token_claims(request)
+    if claims and claims.get("jti") and not revocations.is_revoked(claims["jti"]):
+        await revocations.revoke(dbs, claims["jti"], claims.get("uid"), claims["exp"])
+        await commit(dbs)
+
     response.delete_cookie(
         key="taskease_token",
         httponly=True,
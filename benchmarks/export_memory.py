@@ -0,0 +1,94 @@
+"""
+Peak Python memory of the streaming task export at growing table sizes.
+
+    python -m benchmarks.export_memory 1000 10000 100000 1000000
+
+Runs against a throwaway SQLite file (needs aiosqlite) unless DATABASE_ENDPOINT
+is already set. Prints one JSON object per size.
+"""
+
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+_tmpdir = tempfile.mkdtemp()
+os.environ.setdefault(
+    "DATABASE_ENDPOINT", f"sqlite+aiosqlite:///{_tmpdir}/export_bench.db"
+)
+
+from sqlalchemy import delete, insert, select  # noqa: E402
+
+from models import Base, User, UserTasks, db, export_response  # noqa: E402
+
+
+async def seed(rows: int):
+    async with db.engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.execute(delete(UserTasks))
+        await conn.execute(delete(User))
+        await conn.execute(
+            insert(User),
+            [{"id": 1, "username": "bench", "email": "bench@example.com",
+              "password": "x", "is_verified": True}],
+        )
+        now = datetime.now(timezone.utc)
+        chunk = 10_000
+        for start in range(0, rows, chunk):
+            await conn.execute(
+                insert(UserTasks),
+                [
+                    {
+                        "task_id": f"{i:06x}",
+                        "user_id": 1,
+                        "title": f"task {i}",
+                        "description": "lorem ipsum " * 8,
+                        "status": "low",
+                        "created_at": now,
+                        "last_modified": now,
+                        "duedate": now,
+                        "is_completed": "no",
+                        "is_favor": False,
+                        "color": "blue",
+                    }
+                    for i in range(start, min(start + chunk, rows))
+                ],
+            )
+
+
+async def measure(rows: int, fmt: str) -> dict:
+    await seed(rows)
+    stmt = select(*UserTasks.__table__.columns).where(UserTasks.user_id == 1)
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    response = export_response(stmt, fmt, "tasks")
+    total_bytes = 0
+    async for chunk in response.body_iterator:
+        total_bytes += len(chunk)
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "rows": rows,
+        "format": fmt,
+        "bytes": total_bytes,
+        "seconds": round(elapsed, 3),
+        "peak_mb": round(peak / 1024 / 1024, 2),
+    }
+
+
+async def main(sizes: list[int]):
+    for rows in sizes:
+        for fmt in ("ndjson", "csv"):
+            print(json.dumps(await measure(rows, fmt)), flush=True)
+    await db.engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main([int(n) for n in sys.argv[1:]] or [1_000, 10_000, 100_000]))
@@ -0,0 +1,301 @@
+"""
+In-process load test for the API.
+
+Boots `main:app` against a scratch SQLite database (or DATABASE_ENDPOINT if set)
+and a local aiosmtpd server standing in for SMTP. It registers and verifies
+users through the real email flow, logs them in, and then drives a weighted mix
+of `me` and task CRUD calls at the chosen concurrency. The output is one JSON
+document with throughput and p50/p95/p99 latency per endpoint, plus the mean
+number of DB round trips each route cost.
+
+    python -m benchmarks.loadtest --users 50 --concurrency 20 --operations 5000
+
+Needs httpx, aiosqlite and aiosmtpd on top of requirements.txt.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import secrets
+import socket
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+_tmpdir = tempfile.mkdtemp()
+os.environ.setdefault("DATABASE_ENDPOINT", f"sqlite+aiosqlite:///{_tmpdir}/loadtest.db")
+os.environ.setdefault("SECRET_KEY", secrets.token_hex(32))
+os.environ.setdefault("APP_URL", "https://bench.local/verify")
+os.environ.setdefault("SENDER_EMAIL_ID", "bench@taskease.local")
+os.environ["SMTP_SERVER"] = "127.0.0.1"
+os.environ["SMTP_PORT"] = str(_free_port())
+os.environ["SMTP_START_TLS"] = "false"
+os.environ.pop("SENDER_EMAIL_PASSWORD", None)
+os.environ.setdefault("OUTBOX_POLL_SECONDS", "0.2")
+# every simulated user logs in from 127.0.0.1, so the auth rate limits are off
+for _rate in (
+    "LOGIN_RATE_PER_IP",
+    "LOGIN_RATE_PER_ACCOUNT",
+    "REGISTER_RATE_PER_IP",
+    "REGISTER_RATE_PER_ACCOUNT",
+    "VERIFY_EMAIL_RATE_PER_IP",
+):
+    os.environ[_rate] = "0"
+
+import httpx  # noqa: E402
+from aiosmtpd.controller import Controller  # noqa: E402
+
+from main import app  # noqa: E402
+from utility.metrics import REQUEST_DB_ROUND_TRIPS  # noqa: E402
+
+
+TOKEN_PATTERN = re.compile(r"token=([A-Z0-9]+)")
+
+# endpoint -> relative weight in the steady-state mix
+DEFAULT_MIX = {
+    "me": 30,
+    "list_tasks": 30,
+    "create_task": 20,
+    "update_task": 10,
+    "delete_task": 10,
+}
+
+
+class CaptureHandler:
+    """aiosmtpd handler that remembers the verification token sent to each address."""
+
+    def __init__(self):
+        self.tokens = {}
+        self.received = 0
+
+    async def handle_DATA(self, server, session, envelope):
+        self.received += 1
+        match = TOKEN_PATTERN.search(envelope.content.decode("utf-8", "replace"))
+        if match:
+            for recipient in envelope.rcpt_tos:
+                self.tokens[recipient] = match.group(1)
+        return "250 OK"
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    async def call(self, name: str, request):
+        started = time.perf_counter()
+        try:
+            response = await request
+            ok = response.status_code < 400
+        except Exception:
+            response, ok = None, False
+        self.latencies[name].append(time.perf_counter() - started)
+        if not ok:
+            self.errors[name] += 1
+        return response
+
+    def report(self, elapsed: float) -> dict:
+        endpoints = {}
+        for name, samples in sorted(self.latencies.items()):
+            samples = sorted(samples)
+            endpoints[name] = {
+                "count": len(samples),
+                "errors": self.errors[name],
+                "throughput_rps": round(len(samples) / elapsed, 1),
+                "p50_ms": _percentile(samples, 50),
+                "p95_ms": _percentile(samples, 95),
+                "p99_ms": _percentile(samples, 99),
+            }
+        return endpoints
+
+
+def _percentile(samples: list, pct: int) -> float:
+    if not samples:
+        return 0.0
+    index = max(0, min(len(samples) - 1, round(pct / 100 * len(samples)) - 1))
+    return round(samples[index] * 1000, 2)
+
+
+def _round_trips() -> dict:
+    # mean DB round trips per request, by route, as recorded by MetricsMiddleware
+    return {
+        f"{method} {route}": round(total / count, 2)
+        for (method, route), (_, total, count) in sorted(REQUEST_DB_ROUND_TRIPS.values.items())
+        if count
+    }
+
+
+def _client() -> httpx.AsyncClient:
+    # https base url so the Secure auth cookie is sent back
+    return httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="https://bench.local"
+    )
+
+
+async def _bounded(concurrency: int, jobs):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run(job):
+        async with semaphore:
+            await job
+
+    await asyncio.gather(*(run(job) for job in jobs))
+
+
+async def onboard(recorder, smtp, users: int, concurrency: int) -> list:
+    run_id = secrets.token_hex(3)
+    accounts = [
+        {
+            "username": f"bench-{run_id}-{i}",
+            "email": f"bench-{run_id}-{i}@example.com",
+            "password": "correct horse battery staple",
+        }
+        for i in range(users)
+    ]
+    clients = [_client() for _ in accounts]
+
+    await _bounded(
+        concurrency,
+        [
+            recorder.call("register", client.post("/api/auth/register-user", json=account))
+            for client, account in zip(clients, accounts)
+        ],
+    )
+
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline and not all(
+        account["email"] in smtp.tokens for account in accounts
+    ):
+        await asyncio.sleep(0.1)
+
+    await _bounded(
+        concurrency,
+        [
+            recorder.call(
+                "verify_email",
+                client.post(
+                    "/api/auth/verify-email",
+                    json={"token": smtp.tokens.get(account["email"], "missing")},
+                ),
+            )
+            for client, account in zip(clients, accounts)
+        ],
+    )
+    await _bounded(
+        concurrency,
+        [
+            recorder.call(
+                "login",
+                client.post(
+                    "/api/auth/login",
+                    json={"email": account["email"], "password": account["password"]},
+                ),
+            )
+            for client, account in zip(clients, accounts)
+        ],
+    )
+    return [{"client": client, "tasks": []} for client in clients]
+
+
+async def one_operation(recorder, session: dict, name: str):
+    client, tasks = session["client"], session["tasks"]
+
+    if name in ("update_task", "delete_task") and not tasks:
+        name = "create_task"
+
+    if name == "me":
+        await recorder.call(name, client.get("/api/auth/me"))
+    elif name == "list_tasks":
+        await recorder.call(name, client.get("/api/tasks/"))
+    elif name == "create_task":
+        response = await recorder.call(
+            name, client.post("/api/tasks/", json={"title": "load test"})
+        )
+        if response is not None and response.status_code < 400:
+            tasks.append(response.json()["task"]["task_id"])
+    elif name == "update_task":
+        await recorder.call(
+            name,
+            client.post(
+                "/api/tasks/modify",
+                json={"task_id": random.choice(tasks), "is_favor": True},
+            ),
+        )
+    elif name == "delete_task":
+        task_id = tasks.pop(random.randrange(len(tasks)))
+        await recorder.call(
+            name, client.request("DELETE", "/api/tasks/", json={"task_id": task_id})
+        )
+
+
+async def main(args) -> dict:
+    smtp = CaptureHandler()
+    controller = Controller(smtp, hostname="127.0.0.1", port=int(os.environ["SMTP_PORT"]))
+    controller.start()
+
+    recorder = Recorder()
+    try:
+        async with app.router.lifespan_context(app):
+            sessions = await onboard(recorder, smtp, args.users, args.concurrency)
+
+            names = random.choices(
+                list(DEFAULT_MIX), weights=list(DEFAULT_MIX.values()), k=args.operations
+            )
+            started = time.perf_counter()
+            await _bounded(
+                args.concurrency,
+                [
+                    one_operation(recorder, sessions[i % len(sessions)], name)
+                    for i, name in enumerate(names)
+                ],
+            )
+            elapsed = time.perf_counter() - started
+
+            for session in sessions:
+                await session["client"].aclose()
+    finally:
+        controller.stop()
+
+    return {
+        "config": {
+            "users": args.users,
+            "concurrency": args.concurrency,
+            "operations": args.operations,
+            "database": os.environ["DATABASE_ENDPOINT"].split("://")[0],
+        },
+        "emails_delivered": smtp.received,
+        "duration_seconds": round(elapsed, 3),
+        "throughput_rps": round(args.operations / elapsed, 1),
+        "endpoints": recorder.report(elapsed),
+        "db_round_trips_per_request": _round_trips(),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--operations", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    report = asyncio.run(main(args))
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        sys.stdout.write(text + "\n")
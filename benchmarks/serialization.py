@@ -0,0 +1,76 @@
+"""
+Task-list serialization throughput: FastAPI's default path vs the precompiled
+TypeAdapter path used by the task endpoints.
+
+    python -m benchmarks.serialization [tasks] [rounds]
+
+Does not touch a database; tasks are plain objects shaped like UserTasks rows.
+"""
+
+import json
+import sys
+import time
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+from fastapi.encoders import jsonable_encoder
+
+from rest_schema import TASK_PAGE_ADAPTER
+
+
+def make_tasks(count: int) -> list:
+    now = datetime.now(timezone.utc)
+    return [
+        SimpleNamespace(
+            task_id=f"{i:06x}",
+            user_id=1,
+            title=f"task {i}",
+            description="lorem ipsum dolor sit amet " * 4,
+            status="low",
+            created_at=now,
+            last_modified=now,
+            duedate=now,
+            is_completed="no",
+            is_favor=bool(i % 2),
+            color="blue",
+        )
+        for i in range(count)
+    ]
+
+
+def default_path(tasks) -> bytes:
+    # what FastAPI does for a returned dict of ORM objects with no response_model
+    payload = jsonable_encoder(
+        {"data": [vars(task) for task in tasks], "next_cursor": None}
+    )
+    return json.dumps(payload).encode()
+
+
+def adapter_path(tasks) -> bytes:
+    page = TASK_PAGE_ADAPTER.validate_python(
+        {"data": tasks, "next_cursor": None}, from_attributes=True
+    )
+    return TASK_PAGE_ADAPTER.dump_json(page)
+
+
+def bench(fn, tasks, rounds: int) -> dict:
+    fn(tasks)  # warm up
+    started = time.perf_counter()
+    for _ in range(rounds):
+        size = len(fn(tasks))
+    elapsed = time.perf_counter() - started
+    return {
+        "path": fn.__name__,
+        "tasks": len(tasks),
+        "bytes": size,
+        "ms_per_payload": round(elapsed / rounds * 1000, 2),
+        "tasks_per_second": round(len(tasks) * rounds / elapsed),
+    }
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    tasks = make_tasks(count)
+    for fn in (default_path, adapter_path):
+        print(json.dumps(bench(fn, tasks, rounds)))
@@ -0,0 +1,90 @@
+"""
+Insert throughput into user_tasks with random vs time-ordered (ULID) task ids.
+
+    python -m benchmarks.task_id_insert [rows] [batch]
+
+Both schemes use 26-character ids, so only index locality differs. Runs
+against a scratch SQLite file unless DATABASE_ENDPOINT is set. The gap is
+largest on Postgres once the primary-key index no longer fits in memory. Also
+prints the expected number of collisions for the old 6-hex-char scheme.
+"""
+
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timezone
+
+_tmpdir = tempfile.mkdtemp()
+os.environ.setdefault(
+    "DATABASE_ENDPOINT", f"sqlite+aiosqlite:///{_tmpdir}/task_id_bench.db"
+)
+
+from sqlalchemy import delete, insert  # noqa: E402
+
+from models import Base, User, UserTasks, db  # noqa: E402
+from utility.ids import new_ulid  # noqa: E402
+
+
+SCHEMES = {
+    "random": lambda: uuid.uuid4().hex[:26],
+    "ulid": new_ulid,
+}
+
+
+async def reset():
+    async with db.engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.execute(delete(UserTasks).where(UserTasks.user_id == 1))
+        await conn.execute(delete(User).where(User.id == 1))
+        await conn.execute(
+            insert(User),
+            [{"id": 1, "username": "id-bench", "email": "id-bench@example.com",
+              "password": "x", "is_verified": True}],
+        )
+
+
+async def run(scheme: str, rows: int, batch: int) -> dict:
+    await reset()
+    make_id = SCHEMES[scheme]
+    now = datetime.now(timezone.utc)
+
+    started = time.perf_counter()
+    for _ in range(0, rows, batch):
+        async with db.engine.begin() as conn:
+            await conn.execute(
+                insert(UserTasks),
+                [
+                    {"task_id": make_id(), "user_id": 1, "title": "t", "status": "low",
+                     "created_at": now, "last_modified": now, "duedate": now}
+                    for _ in range(batch)
+                ],
+            )
+    elapsed = time.perf_counter() - started
+    return {
+        "scheme": scheme,
+        "rows": rows,
+        "seconds": round(elapsed, 3),
+        "rows_per_second": round(rows / elapsed),
+    }
+
+
+async def main(rows: int, batch: int):
+    for scheme in SCHEMES:
+        print(json.dumps(await run(scheme, rows, batch)), flush=True)
+    space = 16**6
+    print(json.dumps({
+        "scheme": "hex6 (previous)",
+        "rows": rows,
+        "expected_collisions": round(rows - space + space * ((space - 1) / space) ** rows, 1),
+    }))
+    await db.engine.dispose()
+
+
+if __name__ == "__main__":
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    batch = int(sys.argv[2]) if len(sys.argv) > 2 else 1_000
+    asyncio.run(main(rows, batch))
@@ -1,9 +1,16 @@
+import time
+
+# taken before the heavy imports so cold-start time includes them
+_process_started = time.perf_counter()
+
 from fastapi import FastAPI, HTTPException, Depends
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
 
 # from fastapi.middleware.cors import CORSMiddleware
 from starlette.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
+import asyncio
+import os
 from sqlalchemy.future import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
@@ -13,14 +20,59 @@ from models import *
 from authetication.auth import *
 from rest_schema import *
 from models import task_router as TaskRouter
+from utility.hashing import hasher
+from models.sync import prune_tombstones_forever
+from models.task_cache import task_list_cache
+from models.task_events import task_events
+from models.revocation import revocations
+from models.idempotency import idempotency_store
+from models.fieldsets import USER_FIELDS, parse_fields, user_columns
+from models.principal import get_current_principal, primary_pin
+from utility.compression import CompressionMiddleware
+from utility.metrics import registry, instrument_engine, MetricsMiddleware
+from utility.read_pin import PrimaryPinMiddleware
+
+_imports_done = time.perf_counter()
+startup_timings = {}
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Runs database initialization when the app starts."""
-    await init_db()
+    # production workers skip DDL; prestart.py has already run it once
+    if os.getenv("SKIP_DB_INIT") != "1":
+        await init_db()
+    # revoked tokens must be known before the first request is served
+    await revocations.sync()
+    outbox_worker.start()
+    await task_events.start()
+    pruner = asyncio.create_task(prune_tombstones_forever())
+    revocation_sync = asyncio.create_task(revocations.sync_forever())
+    idempotency_pruner = (
+        asyncio.create_task(idempotency_store.prune_forever())
+        if idempotency_store.persist
+        else None
+    )
+
+    ready = time.perf_counter()
+    startup_timings.update(
+        imports_seconds=_imports_done - _process_started,
+        lifespan_seconds=ready - _imports_done,
+        total_seconds=ready - _process_started,
+    )
+    print(
+        f"Worker {os.getpid()} ready in {startup_timings['total_seconds'] * 1000:.0f} ms "
+        f"(imports {startup_timings['imports_seconds'] * 1000:.0f} ms)"
+    )
     yield
-    await db.engine.dispose()
+    pruner.cancel()
+    revocation_sync.cancel()
+    if idempotency_pruner is not None:
+        idempotency_pruner.cancel()
+    await task_events.stop()
+    await outbox_worker.stop()
+    hasher.shutdown()
+    await db.dispose()
 
 
 app = FastAPI(lifespan=lifespan)
@@ -44,34 +96,144 @@ app.add_middleware(
         "DELETE",
         "OPTIONS",
     ],  # Explicitly allow POST
-    allow_headers=["Content-Type", "Authorization"],
+    allow_headers=["Content-Type", "Authorization", "Idempotency-Key"],
+)
+
+app.add_middleware(PrimaryPinMiddleware, pin=primary_pin)
+# added before MetricsMiddleware so latency includes compression time
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=int(os.getenv("COMPRESSION_MIN_BYTES", "1024")),
 )
+app.add_middleware(MetricsMiddleware, skip_paths=("/metrics", "/api/tasks/events"))
+instrument_engine(db.engine)
+for replica in db.replicas:
+    instrument_engine(replica.engine)
+
+
+def _hasher_metrics():
+    stats = hasher.snapshot()
+    yield "password_hash_calls_total", "counter", "Hash/verify calls", stats["calls"]
+    yield "password_hash_rejected_total", "counter", "Calls shed with 503", stats["rejected"]
+    yield "password_hash_seconds_total", "counter", "Time spent hashing", stats["total_seconds"]
+    yield "password_hash_in_flight", "gauge", "Hash calls running or queued", stats["in_flight"]
+
+
+def _pool_metrics():
+    stats = db.pool_monitor.snapshot()
+    yield "db_pool_checkouts_total", "counter", "Connection checkouts", stats["checkouts"]
+    yield "db_pool_connects_total", "counter", "New DB connections", stats["connects"]
+    yield "db_pool_checkout_timeouts_total", "counter", "Checkout timeouts", stats["checkout_timeouts"]
+    yield "db_pool_wait_seconds_total", "counter", "Time waiting for a connection", stats["wait_seconds_total"]
+    for name in ("checkedout", "idle", "overflow"):
+        if name in stats:
+            yield f"db_pool_{name}", "gauge", f"Pool connections ({name})", stats[name]
+
+
+def _task_cache_metrics():
+    stats = task_list_cache.snapshot()
+    yield "task_cache_hits_total", "counter", "Task list cache hits", stats["hits"]
+    yield "task_cache_misses_total", "counter", "Task list cache misses", stats["misses"]
+    yield "task_cache_stampede_joins_total", "counter", "Misses served by an in-flight load", stats["stampede_joins"]
+    yield "task_cache_evictions_total", "counter", "Entries evicted for size", stats["evictions"]
+    yield "task_cache_bytes", "gauge", "Bytes held by the task list cache", stats["bytes"]
+
+
+def _task_event_metrics():
+    yield "task_event_connections", "gauge", "Open task event streams", task_events.broker.connections
+    yield "task_event_listener_reconnects_total", "counter", "LISTEN connections re-established", task_events.reconnects
+
+
+def _revocation_metrics():
+    yield "revoked_tokens", "gauge", "Unexpired revoked tokens held in memory", len(revocations)
+
+
+def _idempotency_metrics():
+    yield "idempotent_replays_total", "counter", "Retried writes answered from the idempotency store", idempotency_store.replays
+
+
+def _startup_metrics():
+    if startup_timings:
+        yield "app_startup_seconds", "gauge", "Process start to ready", startup_timings["total_seconds"]
+
+
+registry.add_collector(_hasher_metrics)
+registry.add_collector(_startup_metrics)
+registry.add_collector(_task_event_metrics)
+registry.add_collector(_revocation_metrics)
+registry.add_collector(_idempotency_metrics)
+registry.add_collector(_task_cache_metrics)
+registry.add_collector(_pool_metrics)
 
 app.include_router(AuthRouter, prefix="/api/auth")
 app.include_router(TaskRouter, prefix="/api/tasks")
 
 
-@app.get("/api/users")
-async def get_all_users(dbs: AsyncSession = Depends(get_db)):
+@app.get("/api/users", response_model=UserList)
+async def get_all_users(
+    dbs: AsyncSession = Depends(get_read_db), fields: str | None = None
+):
+    columns = parse_fields(fields, USER_FIELDS, required=("id",))
+    if columns is not None:
+        result = await dbs.execute(select(*user_columns(columns)).order_by(User.id))
+        return json_response(
+            PARTIAL_USER_LIST_ADAPTER,
+            {
+                "status_code": 200,
+                "message": "Users fetched successfully",
+                "data": [row._asdict() for row in result.all()],
+            },
+        )
+
     result = await dbs.execute(select(User))
     users = result.scalars().all()
 
-    users_data = [UserSchema.model_validate(user).model_dump() for user in users]
-
     response_data = {
         "status_code": 200,
         "message": "Users fetched successfully",
-        "data": users_data,
+        "data": users,
     }
 
-    return JSONResponse(status_code=200, content=response_data)
+    return json_response(USER_LIST_ADAPTER, response_data)
+
+
+@app.get("/api/users/export")
+async def export_users(
+    user: dict = Depends(get_current_principal), format: str = "ndjson"
+):
+    """Streams the user directory as NDJSON or CSV; signed-in callers only."""
+    stmt = select(User.id, User.username, User.email, User.is_verified).order_by(
+        User.id
+    )
+    return export_response(stmt, format, "users")
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus text exposition for this worker."""
+    return PlainTextResponse(
+        registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+
+@app.get("/api/health/pool")
+async def pool_status():
+    """Connection pool sizing and checkout statistics for this worker."""
+    return {
+        "primary": db.pool_monitor.snapshot(),
+        "replicas": [
+            {"healthy": replica.healthy, **replica.pool_monitor.snapshot()}
+            for replica in db.replicas
+        ],
+    }
 
 
 @app.delete("/api/ruin/")
 async def delete_all_users(dbs: AsyncSession = Depends(get_db)):
 
     await dbs.execute(text("TRUNCATE TABLE USERS"))
-    await dbs.commit()
+    await commit(dbs)
+    clear_principals()
 
     return {"message": "Table Truncated"}
 
@@ -80,7 +242,7 @@ async def delete_all_users(dbs: AsyncSession = Depends(get_db)):
 
 
 @app.post("/api/test")
-async def test(email: str, dbs=Depends(get_db)):
+async def test(email: str, dbs=Depends(get_read_db)):
 
     r = await db.existing_user(dbs, email, True)
 
@@ -1,3 +1,6 @@
 from .model import *
 from .task_core import task_router
 from .utils import *
+from .mailer import *
+from .principal import *
+from .export import export_response
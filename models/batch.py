@@ -0,0 +1,129 @@
+from fastapi import HTTPException
+from sqlalchemy import delete, insert, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from rest_schema import TaskBatch
+from .model import UserTasks
+from .sync import bump_collection_version, record_deletions
+from .stats import STAT_FIELDS, apply_counter_deltas, task_deltas
+
+
+async def apply_task_batch(dbs: AsyncSession, user_id: int, batch: TaskBatch) -> list:
+    """
+    Runs a mixed list of create/update/delete operations in the caller's transaction.
+
+    Operations are applied in three phases - all creates, then updates, then
+    deletes - with one statement per phase, so a batch costs a constant number
+    of round trips. Returns one result dict per operation, in request order;
+    an update setting no fields is reported as "unchanged".
+    """
+    operations = batch.operations
+
+    results = [None] * len(operations)
+    creates, updates, deletes = [], [], []
+    for index, operation in enumerate(operations):
+        if operation.op == "create":
+            creates.append((index, operation.task))
+        elif operation.op == "update":
+            updates.append((index, operation.task))
+        else:
+            deletes.append((index, operation.task_id))
+
+    # task_id -> current status/is_completed/is_favor, for counter deltas
+    state = {}
+    added, removed = [], []
+
+    created_ids = set()
+    if creates:
+        rows = [{**task.model_dump(), "user_id": user_id} for _, task in creates]
+        try:
+            result = await dbs.execute(
+                insert(UserTasks).returning(
+                    UserTasks.task_id, sort_by_parameter_order=True
+                ),
+                rows,
+            )
+        except IntegrityError:
+            raise HTTPException(status_code=409, detail="Duplicate task_id in batch")
+        for (index, _), task_id, row in zip(creates, result.scalars().all(), rows):
+            created_ids.add(task_id)
+            state[task_id] = {field: row[field] for field in STAT_FIELDS}
+            added.append(row)
+            results[index] = {"op": "create", "task_id": task_id, "status": "created"}
+
+    # ownership (and current counter fields) of everything the batch touches,
+    # in one query
+    referenced = {task.task_id for _, task in updates} | {
+        task_id for _, task_id in deletes
+    }
+    owned = set(created_ids)
+    if referenced - owned:
+        result = await dbs.execute(
+            select(UserTasks.task_id, *(getattr(UserTasks, f) for f in STAT_FIELDS))
+            .where(
+                UserTasks.user_id == user_id,
+                UserTasks.task_id.in_(referenced - owned),
+            )
+            .with_for_update()
+        )
+        for row in result.all():
+            owned.add(row.task_id)
+            state[row.task_id] = {field: getattr(row, field) for field in STAT_FIELDS}
+
+    update_rows = []
+    for index, task in updates:
+        changes = task.model_dump(exclude_unset=True)
+        if task.task_id not in owned:
+            status = "not_found"
+        elif len(changes) == 1:
+            # only task_id was sent
+            status = "unchanged"
+        else:
+            update_rows.append(changes)
+            before = state[task.task_id]
+            after = {
+                field: changes[field] if field in changes else before[field]
+                for field in STAT_FIELDS
+            }
+            removed.append(before)
+            added.append(after)
+            state[task.task_id] = after
+            status = "updated"
+        results[index] = {"op": "update", "task_id": task.task_id, "status": status}
+
+    if update_rows:
+        # ORM bulk UPDATE by primary key, sent as executemany
+        await dbs.execute(update(UserTasks), update_rows)
+
+    delete_ids = {task_id for _, task_id in deletes if task_id in owned}
+    deleted = set()
+    if delete_ids:
+        result = await dbs.execute(
+            delete(UserTasks)
+            .where(UserTasks.user_id == user_id, UserTasks.task_id.in_(delete_ids))
+            .returning(UserTasks.task_id, *(getattr(UserTasks, f) for f in STAT_FIELDS))
+        )
+        rows = result.all()
+        deleted = {row.task_id for row in rows}
+        removed.extend(rows)
+
+    if deleted:
+        # also bumps the collection version
+        await record_deletions(dbs, user_id, list(deleted))
+    elif created_ids or update_rows:
+        await bump_collection_version(dbs, user_id)
+
+    await apply_counter_deltas(dbs, user_id, task_deltas(added, removed))
+
+    for index, task_id in deletes:
+        results[index] = {
+            "op": "delete",
+            "task_id": task_id,
+            "status": "deleted" if task_id in deleted else "not_found",
+        }
+        # a task can only be deleted once per batch
+        deleted.discard(task_id)
+
+    return results
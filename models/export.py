@@ -0,0 +1,59 @@
+import csv
+import io
+import json
+import os
+
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+
+from .model import db
+
+
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", "1000"))
+EXPORT_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+
+def _encode_ndjson(keys, rows) -> bytes:
+    return "".join(
+        json.dumps(dict(zip(keys, row)), default=str) + "\n" for row in rows
+    ).encode()
+
+
+def _encode_csv(rows) -> bytes:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    return buffer.getvalue().encode()
+
+
+async def stream_rows(stmt, fmt: str, primary=False):
+    """
+    Yields `stmt`'s rows encoded as NDJSON or CSV, one chunk per partition.
+    Opens its own session because the request's session is closed before the
+    body is streamed; rows come off a server-side cursor `EXPORT_CHUNK_SIZE` at a
+    time, so memory stays bounded by the chunk size, not the table size.
+    """
+    # server-side cursors need a transaction, so no autocommit here
+    async with db.get_read_db(primary, autocommit=False) as dbs:
+        result = await dbs.stream(stmt.execution_options(yield_per=EXPORT_CHUNK_SIZE))
+        keys = list(result.keys())
+
+        if fmt == "csv":
+            yield _encode_csv([keys])
+
+        async for rows in result.partitions():
+            yield _encode_ndjson(keys, rows) if fmt == "ndjson" else _encode_csv(rows)
+
+
+def export_response(stmt, fmt: str, filename: str, primary=False) -> StreamingResponse:
+    if fmt not in EXPORT_MEDIA_TYPES:
+        raise HTTPException(
+            status_code=400, detail=f"format must be one of {', '.join(EXPORT_MEDIA_TYPES)}"
+        )
+    return StreamingResponse(
+        stream_rows(stmt, fmt, primary),
+        media_type=EXPORT_MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{fmt}"'},
+    )
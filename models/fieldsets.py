@@ -0,0 +1,35 @@
+from fastapi import HTTPException
+
+from .model import User, UserTasks
+
+
+TASK_FIELDS = tuple(column.key for column in UserTasks.__table__.columns)
+# never password or verification_token
+USER_FIELDS = ("id", "username", "email", "is_verified")
+
+
+def parse_fields(fields: str | None, allowed: tuple, required: tuple = ()) -> list | None:
+    """
+    Turns `fields=a,b` into the column names to SELECT, in `allowed` order,
+    always including `required`; None when the caller wants every field.
+    """
+    if not fields:
+        return None
+    requested = {name.strip() for name in fields.split(",") if name.strip()}
+    unknown = requested - set(allowed)
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown fields: {', '.join(sorted(unknown))}; "
+            f"allowed: {', '.join(allowed)}",
+        )
+    requested.update(required)
+    return [name for name in allowed if name in requested]
+
+
+def task_columns(names: list):
+    return [getattr(UserTasks, name) for name in names]
+
+
+def user_columns(names: list):
+    return [getattr(User, name) for name in names]
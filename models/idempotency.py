@@ -0,0 +1,172 @@
+import hashlib
+import os
+from datetime import datetime, timezone, timedelta
+
+import orjson
+from fastapi import HTTPException, Request, Response
+from sqlalchemy import delete, insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from utility.cache import TTLCache
+from utility.periodic import run_periodically
+from .model import IdempotencyRecord, db, commit, on_commit
+
+
+IDEMPOTENCY_TTL_SECONDS = float(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400"))
+IDEMPOTENCY_MAX_KEYS = int(os.getenv("IDEMPOTENCY_MAX_KEYS", "10000"))
+# "1" also keeps records in idempotency_records, shared by all workers
+IDEMPOTENCY_PERSIST = os.getenv("IDEMPOTENCY_PERSIST", "0") == "1"
+IDEMPOTENCY_PRUNE_INTERVAL_SECONDS = int(
+    os.getenv("IDEMPOTENCY_PRUNE_INTERVAL_SECONDS", "3600")
+)
+IDEMPOTENCY_KEY_MAX_LENGTH = 255
+
+
+class IdempotencyStore:
+    """
+    Remembers the response to each (user, Idempotency-Key) so a retried
+    write is answered from here instead of being applied twice.
+
+    Records live in an LRU/TTL cache; with `persist` they are also written to
+    idempotency_records in the write's own transaction, so a record exists
+    exactly when the write committed.
+    """
+
+    def __init__(self, maxsize: int, ttl: float, persist: bool):
+        self.ttl = ttl
+        self.persist = persist
+        # (user_id, key) -> (fingerprint, status_code, media_type, body)
+        self._records = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._in_flight = set()
+        self.replays = 0
+
+    async def run(self, request: Request, dbs: AsyncSession, user_id: int, operation):
+        """
+        Runs `await operation()` in `dbs`'s transaction and commits it, unless
+        the request's Idempotency-Key has already been answered.
+        """
+        key = request.headers.get("Idempotency-Key")
+        if key is None:
+            response = await operation()
+            await commit(dbs)
+            return response
+        if not key or len(key) > IDEMPOTENCY_KEY_MAX_LENGTH:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Idempotency-Key must be 1-{IDEMPOTENCY_KEY_MAX_LENGTH} characters",
+            )
+
+        fingerprint = hashlib.sha256(
+            b"%s %s\n%s" % (request.method.encode(), request.url.path.encode(), await request.body())
+        ).hexdigest()
+
+        record = await self._lookup(dbs, user_id, key)
+        if record is not None:
+            return self._replay(record, fingerprint)
+
+        if (user_id, key) in self._in_flight:
+            raise HTTPException(
+                status_code=409,
+                detail="A request with this Idempotency-Key is in progress",
+                headers={"Retry-After": "1"},
+            )
+
+        self._in_flight.add((user_id, key))
+        try:
+            response = await operation()
+            if not isinstance(response, Response):
+                # handlers usually return json_response bytes already
+                response = Response(orjson.dumps(response), media_type="application/json")
+            record = (fingerprint, response.status_code, response.media_type, bytes(response.body))
+            await self._save(dbs, user_id, key, record)
+            await commit(dbs)
+            return response
+        finally:
+            self._in_flight.discard((user_id, key))
+
+    async def _lookup(self, dbs: AsyncSession, user_id: int, key: str):
+        record = self._records.get((user_id, key))
+        if record is not None or not self.persist:
+            return record
+
+        result = await dbs.execute(
+            select(
+                IdempotencyRecord.fingerprint,
+                IdempotencyRecord.status_code,
+                IdempotencyRecord.media_type,
+                IdempotencyRecord.body,
+            ).where(
+                IdempotencyRecord.user_id == user_id,
+                IdempotencyRecord.key == key,
+                IdempotencyRecord.created_at
+                > datetime.now(timezone.utc) - timedelta(seconds=self.ttl),
+            )
+        )
+        row = result.one_or_none()
+        if row is None:
+            return None
+        record = tuple(row)
+        self._records.set((user_id, key), record)
+        return record
+
+    def _replay(self, record, fingerprint: str) -> Response:
+        stored_fingerprint, status_code, media_type, body = record
+        if stored_fingerprint != fingerprint:
+            raise HTTPException(
+                status_code=422,
+                detail="Idempotency-Key was already used for a different request",
+            )
+        self.replays += 1
+        return Response(
+            content=body,
+            status_code=status_code,
+            media_type=media_type,
+            headers={"Idempotent-Replayed": "true"},
+        )
+
+    async def _save(self, dbs: AsyncSession, user_id: int, key: str, record):
+        if self.persist:
+            fingerprint, status_code, media_type, body = record
+            try:
+                await dbs.execute(
+                    insert(IdempotencyRecord).values(
+                        user_id=user_id,
+                        key=key,
+                        fingerprint=fingerprint,
+                        status_code=status_code,
+                        media_type=media_type,
+                        body=body,
+                    )
+                )
+            except IntegrityError:
+                # another worker committed the same key first
+                raise HTTPException(
+                    status_code=409,
+                    detail="A request with this Idempotency-Key was already processed",
+                )
+
+        async def remember():
+            self._records.set((user_id, key), record)
+
+        on_commit(dbs, remember)
+
+    async def prune(self) -> int:
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=self.ttl)
+        async with db.get_db() as dbs:
+            result = await dbs.execute(
+                delete(IdempotencyRecord).where(IdempotencyRecord.created_at < cutoff)
+            )
+            return result.rowcount
+
+    async def prune_forever(self):
+        """Started from the app lifespan when records are persisted."""
+        await run_periodically(
+            self.prune, IDEMPOTENCY_PRUNE_INTERVAL_SECONDS, "Idempotency record pruning"
+        )
+
+
+idempotency_store = IdempotencyStore(
+    IDEMPOTENCY_MAX_KEYS, IDEMPOTENCY_TTL_SECONDS, IDEMPOTENCY_PERSIST
+)
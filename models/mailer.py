@@ -0,0 +1,198 @@
+import asyncio
+import os
+from datetime import datetime, timezone, timedelta
+
+import aiosmtplib
+from sqlalchemy import or_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from .model import EmailOutbox, db, on_commit
+from .utils import build_verification_email
+
+
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "20"))
+OUTBOX_POLL_SECONDS = float(os.getenv("OUTBOX_POLL_SECONDS", "5"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "6"))
+OUTBOX_RESEND_COOLDOWN_SECONDS = int(os.getenv("OUTBOX_RESEND_COOLDOWN_SECONDS", "300"))
+
+
+async def queue_verification_email(
+    dbs: AsyncSession, recipient_email: str, user_name: str, token: str
+) -> bool:
+    """
+    Adds a verification email to the outbox without committing, so it lands in
+    the caller's transaction. Skips the message if the same token was already
+    queued within the resend cooldown.
+    """
+    cutoff = datetime.now(timezone.utc) - timedelta(
+        seconds=OUTBOX_RESEND_COOLDOWN_SECONDS
+    )
+    result = await dbs.execute(
+        select(EmailOutbox.id)
+        .where(
+            EmailOutbox.token == token,
+            or_(EmailOutbox.status == "pending", EmailOutbox.created_at >= cutoff),
+        )
+        .limit(1)
+    )
+    if result.scalar_one_or_none() is not None:
+        return False
+
+    dbs.add(
+        EmailOutbox(
+            kind="verification",
+            recipient=recipient_email,
+            username=user_name,
+            token=token,
+            status="pending",
+            attempts=0,
+            created_at=datetime.now(timezone.utc),
+            next_attempt_at=datetime.now(timezone.utc),
+        )
+    )
+    return True
+
+
+class SMTPConnection:
+    """Keeps one authenticated SMTP session open and reconnects when it drops."""
+
+    def __init__(self):
+        self.hostname = os.getenv("SMTP_SERVER")
+        self.port = int(os.getenv("SMTP_PORT") or 587)
+        self.username = os.getenv("SENDER_EMAIL_ID")
+        self.password = os.getenv("SENDER_EMAIL_PASSWORD")
+        self.start_tls = os.getenv("SMTP_START_TLS", "true").lower() == "true"
+        self._client: aiosmtplib.SMTP | None = None
+
+    async def _connect(self):
+        client = aiosmtplib.SMTP(
+            hostname=self.hostname,
+            port=self.port,
+            use_tls=False,
+            start_tls=self.start_tls,
+        )
+        await client.connect()
+        if self.username and self.password:
+            await client.login(self.username, self.password)
+        self._client = client
+
+    async def send(self, msg):
+        if self._client is None or not self._client.is_connected:
+            await self._connect()
+        try:
+            await self._client.send_message(msg)
+        except (aiosmtplib.SMTPServerDisconnected, ConnectionError):
+            # server closed an idle connection, retry once on a fresh one
+            await self.close()
+            await self._connect()
+            await self._client.send_message(msg)
+
+    async def close(self):
+        if self._client is not None:
+            try:
+                await self._client.quit()
+            except Exception:
+                self._client.close()
+            self._client = None
+
+
+class OutboxWorker:
+    """Background task that drains `email_outbox` in batches over a reused SMTP connection."""
+
+    def __init__(self, session_factory, batch_size: int, poll_seconds: float):
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.poll_seconds = poll_seconds
+        self.smtp = SMTPConnection()
+        self._wake = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.smtp.close()
+
+    def notify(self):
+        """Wake the worker early instead of waiting for the next poll."""
+        self._wake.set()
+
+    def notify_on_commit(self, dbs: AsyncSession):
+        """notify() once `dbs` commits, when the rows it queued are visible to the worker."""
+
+        async def wake():
+            self.notify()
+
+        on_commit(dbs, wake)
+
+    async def _run(self):
+        while True:
+            try:
+                delivered = await self.deliver_batch()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Outbox delivery failed: {e}")
+                delivered = 0
+
+            if delivered < self.batch_size:
+                try:
+                    await asyncio.wait_for(self._wake.wait(), self.poll_seconds)
+                except asyncio.TimeoutError:
+                    pass
+                self._wake.clear()
+
+    async def deliver_batch(self) -> int:
+        """Sends one batch of due messages; returns how many rows were processed."""
+        async with self.session_factory() as dbs:
+            now = datetime.now(timezone.utc)
+            result = await dbs.execute(
+                select(EmailOutbox)
+                .where(
+                    EmailOutbox.status == "pending",
+                    EmailOutbox.next_attempt_at <= now,
+                )
+                .order_by(EmailOutbox.id)
+                .limit(self.batch_size)
+                .with_for_update(skip_locked=True)
+            )
+            messages = result.scalars().all()
+
+            for message in messages:
+                try:
+                    await self.smtp.send(
+                        build_verification_email(
+                            message.recipient, message.username, message.token
+                        )
+                    )
+                    message.status = "sent"
+                    message.sent_at = datetime.now(timezone.utc)
+                    message.last_error = None
+                except Exception as e:
+                    await self.smtp.close()
+                    message.attempts += 1
+                    message.last_error = str(e)
+                    if message.attempts >= OUTBOX_MAX_ATTEMPTS:
+                        message.status = "failed"
+                    else:
+                        # exponential backoff: 2s, 4s, 8s, ...
+                        message.next_attempt_at = datetime.now(
+                            timezone.utc
+                        ) + timedelta(seconds=2**message.attempts)
+
+            await dbs.commit()
+            return len(messages)
+
+
+outbox_worker = OutboxWorker(
+    db.SessionLocal, batch_size=OUTBOX_BATCH_SIZE, poll_seconds=OUTBOX_POLL_SECONDS
+)
@@ -4,7 +4,8 @@ from sqlalchemy.ext.asyncio import (
     create_async_engine,
 )
 from sqlalchemy.orm import sessionmaker, declarative_base, relationship
-from sqlalchemy.exc import IntegrityError
+from sqlalchemy.exc import IntegrityError, DBAPIError
+from fastapi import HTTPException
 from contextlib import asynccontextmanager
 from sqlalchemy import (
     Column,
@@ -12,25 +13,75 @@ from sqlalchemy import (
     Text,
     String,
     Boolean,
+    LargeBinary,
     text,
     ForeignKey,
     DateTime,
+    Index,
+    case,
+    literal,
+    union_all,
+    insert,
+    inspect,
 )
 from sqlalchemy.future import select
+from sqlalchemy.dialects import postgresql, sqlite
 import os
 from dotenv import load_dotenv
 from datetime import datetime, timezone
 from sqlalchemy.sql import func
+from sqlalchemy.sql.expression import FunctionElement
+from sqlalchemy.ext.compiler import compiles
+from .pool import PoolMonitor, engine_options
+import itertools
+import time
 
 load_dotenv()
 
 
 #  Use asyncpg for PostgreSQL
 DATABASE_URL = os.getenv("DATABASE_ENDPOINT")
+# optional, comma separated; GET handlers read from these when healthy
+DATABASE_REPLICA_URLS = [
+    url.strip()
+    for url in os.getenv("DATABASE_REPLICA_ENDPOINTS", "").split(",")
+    if url.strip()
+]
+# how long a user's reads stay on the primary after they write
+READ_YOUR_WRITES_SECONDS = float(os.getenv("READ_YOUR_WRITES_SECONDS", "5"))
+REPLICA_RETRY_SECONDS = float(os.getenv("REPLICA_RETRY_SECONDS", "30"))
 
 Base = declarative_base()
 
 
+class utcnow(FunctionElement):
+    """
+    Current timestamp, stored in the same text format SQLAlchemy binds
+    datetimes in on SQLite, so keyset comparisons against bound cursor values
+    line up. Plain now() everywhere else.
+    """
+
+    type = DateTime(timezone=True)
+    inherit_cache = True
+
+
+@compiles(utcnow)
+def _utcnow_default(element, compiler, **kw):
+    return compiler.process(func.now(), **kw)
+
+
+@compiles(utcnow, "sqlite")
+def _utcnow_sqlite(element, compiler, **kw):
+    # CURRENT_TIMESTAMP has whole seconds only; %f gives milliseconds, padded
+    # to the microseconds of SQLAlchemy's '%Y-%m-%d %H:%M:%S.%f'
+    return "STRFTIME('%Y-%m-%d %H:%M:%f000', 'now')"
+
+
+def as_utc(value: datetime) -> datetime:
+    """Timestamps are stored as UTC, but SQLite hands them back naive."""
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
 class User(Base):
     __tablename__ = "users"
 
@@ -48,18 +99,18 @@ class User(Base):
 class UserTasks(Base):
     __tablename__ = "user_tasks"
 
-    task_id = Column(String(6), primary_key=True)
+    task_id = Column(String(26), primary_key=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     title = Column(Text, nullable=False)
     description = Column(Text, nullable=True)
     status = Column(String(255), nullable=False)
 
-    created_at = Column(DateTime(timezone=True), default=func.now(), nullable=False)
+    created_at = Column(DateTime(timezone=True), default=utcnow(), nullable=False)
     last_modified = Column(
-        DateTime(timezone=True), default=func.now(), onupdate=func.now(), nullable=False
+        DateTime(timezone=True), default=utcnow(), onupdate=utcnow(), nullable=False
     )  # Fix here
 
-    duedate = Column(DateTime(timezone=True), nullable=False, default=func.now())
+    duedate = Column(DateTime(timezone=True), nullable=False, default=utcnow())
     is_completed = Column(String(3), nullable=False, default="no")
     is_favor = Column(Boolean, nullable=False, default=False)
     color = Column(String(255), default="blue", nullable=True)
@@ -67,18 +118,173 @@ class UserTasks(Base):
     # Relationship to users table
     user = relationship("User", back_populates="tasks")
 
+    # keyset pagination: one index per supported sort order
+    __table_args__ = (
+        Index("ix_user_tasks_user_duedate", "user_id", "duedate", "task_id"),
+        Index("ix_user_tasks_user_created", "user_id", "created_at", "task_id"),
+        Index("ix_user_tasks_user_modified", "user_id", "last_modified", "task_id"),
+    )
+
+
+class TaskCollectionState(Base):
+    """Per-user bookkeeping for the task list that can't be derived from user_tasks."""
+
+    __tablename__ = "task_collection_state"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    # bumped by every transaction that changes the user's tasks
+    version = Column(Integer, nullable=False, default=0)
+
+
+class TaskTombstone(Base):
+    """Marks a deleted task so delta sync clients can drop it; pruned after retention."""
+
+    __tablename__ = "task_tombstones"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    task_id = Column(String(26), nullable=False)
+    deleted_at = Column(DateTime(timezone=True), default=utcnow(), nullable=False)
+
+    __table_args__ = (
+        Index("ix_task_tombstones_user_deleted", "user_id", "deleted_at", "id"),
+        Index("ix_task_tombstones_deleted", "deleted_at"),
+    )
+
+
+class UserTaskCounter(Base):
+    """
+    Incrementally maintained per-user task counts, one row per counter name:
+    "total", "completed", "favorite" and "status:<status>".
+    """
+
+    __tablename__ = "user_task_counters"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    # Text: "status:" + a status that may itself be 255 characters
+    name = Column(Text, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+
+def task_counter_source(user_id=None):
+    """SELECT producing (user_id, name, count) rows recomputed from user_tasks."""
+
+    def scoped(stmt):
+        if user_id is not None:
+            stmt = stmt.where(UserTasks.user_id == user_id)
+        return stmt.group_by(UserTasks.user_id)
+
+    total = scoped(
+        select(UserTasks.user_id, literal("total").label("name"), func.count().label("count"))
+    )
+    completed = scoped(
+        select(
+            UserTasks.user_id,
+            literal("completed"),
+            func.sum(case((UserTasks.is_completed == "yes", 1), else_=0)),
+        )
+    )
+    favorite = scoped(
+        select(
+            UserTasks.user_id,
+            literal("favorite"),
+            func.sum(case((UserTasks.is_favor.is_(True), 1), else_=0)),
+        )
+    )
+    by_status = scoped(
+        select(UserTasks.user_id, literal("status:") + UserTasks.status, func.count())
+    ).group_by(UserTasks.status)
+    return union_all(total, completed, favorite, by_status)
+
+
+class EmailOutbox(Base):
+    __tablename__ = "email_outbox"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    kind = Column(String(32), nullable=False, default="verification")
+    recipient = Column(String(255), nullable=False)
+    username = Column(String(255), nullable=False)
+    token = Column(String(255), nullable=True, index=True)
+    status = Column(String(16), nullable=False, default="pending", index=True)
+    attempts = Column(Integer, nullable=False, default=0)
+    last_error = Column(Text, nullable=True)
+
+    created_at = Column(DateTime(timezone=True), default=utcnow(), nullable=False)
+    next_attempt_at = Column(
+        DateTime(timezone=True), default=utcnow(), nullable=False
+    )
+    sent_at = Column(DateTime(timezone=True), nullable=True)
+
+
+class RevokedToken(Base):
+    """A token (by its jti) that must be rejected until it would have expired anyway."""
+
+    __tablename__ = "revoked_tokens"
+
+    jti = Column(String(26), primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=True)
+    revoked_at = Column(DateTime(timezone=True), default=utcnow(), nullable=False, index=True)
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
+
+
+class IdempotencyRecord(Base):
+    """The stored response for one (user, Idempotency-Key), replayed on retries."""
+
+    __tablename__ = "idempotency_records"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    key = Column(String(255), primary_key=True)
+    fingerprint = Column(String(64), nullable=False)
+    status_code = Column(Integer, nullable=False)
+    media_type = Column(String(100), nullable=True)
+    body = Column(LargeBinary, nullable=False)
+    created_at = Column(DateTime(timezone=True), default=utcnow(), nullable=False, index=True)
+
+
+def read_sessionmaker(engine):
+    """
+    Sessions on an AUTOCOMMIT view of `engine`'s pool: each SELECT runs on its
+    own, with no BEGIN before it and no COMMIT/ROLLBACK after it.
+    """
+    return sessionmaker(
+        engine.execution_options(isolation_level="AUTOCOMMIT"),
+        expire_on_commit=False,
+        class_=AsyncSession,
+    )
+
+
+class ReplicaEngine:
+    """A read replica plus the time until which it is considered unhealthy."""
+
+    def __init__(self, url):
+        self.engine = create_async_engine(url, **engine_options(url))
+        self.pool_monitor = PoolMonitor(self.engine)
+        self.SessionLocal = sessionmaker(
+            self.engine, expire_on_commit=False, class_=AsyncSession
+        )
+        self.ReadSessionLocal = read_sessionmaker(self.engine)
+        self.unhealthy_until = 0.0
+
+    @property
+    def healthy(self):
+        return time.monotonic() >= self.unhealthy_until
+
 
 class SingletonDB:
     _instance = None
 
-    def __new__(cls, url):
+    def __new__(cls, url, replica_urls=()):
         if cls._instance is None:
             try:
                 cls._instance = super().__new__(cls)
-                cls._instance.engine = create_async_engine(url, echo=True)
+                cls._instance.engine = create_async_engine(url, **engine_options(url))
+                cls._instance.pool_monitor = PoolMonitor(cls._instance.engine)
                 cls._instance.SessionLocal = sessionmaker(
                     cls._instance.engine, expire_on_commit=False, class_=AsyncSession
                 )
+                cls._instance.ReadSessionLocal = read_sessionmaker(cls._instance.engine)
+                cls._instance.replicas = [ReplicaEngine(u) for u in replica_urls]
+                cls._instance._next_replica = itertools.count()
             except Exception as e:
                 print(f"Database connection failed: {e}")
                 cls._instance = None
@@ -86,24 +292,74 @@ class SingletonDB:
 
     @asynccontextmanager
     async def get_db(self):
-        """Provides an async session with proper cleanup."""
+        """
+        One unit of work per request: whatever the handler leaves open is
+        committed exactly once on exit, or rolled back if it raised. Handlers
+        that must see the outcome before responding end the unit themselves
+        with `await commit(dbs)`; the exit then has nothing left to commit.
+        """
         db_ = self.SessionLocal()
         try:
+            await self.pool_monitor.acquire(db_)
             yield db_
-            await db_.commit()
+            await commit(db_)
         except Exception:
+            db_.info.pop("on_commit", None)
             await db_.rollback()
             raise
         finally:
             await db_.close()
 
+    def _healthy_replicas(self, primary=False):
+        if not self.replicas or primary:
+            return []
+        start = next(self._next_replica)
+        ordered = self.replicas[start % len(self.replicas):] + self.replicas[
+            : start % len(self.replicas)
+        ]
+        return [replica for replica in ordered if replica.healthy]
+
+    @asynccontextmanager
+    async def get_read_db(self, primary=False, autocommit=True):
+        """
+        Read-only session on a healthy replica, falling back to the primary;
+        `primary=True` skips the replicas, e.g. right after the caller wrote.
+        By default it runs in AUTOCOMMIT, skipping BEGIN/COMMIT entirely; pass
+        `autocommit=False` for a transaction, e.g. for server-side cursors.
+        """
+        db_ = None
+        for replica in self._healthy_replicas(primary):
+            factory = replica.ReadSessionLocal if autocommit else replica.SessionLocal
+            candidate = factory()
+            try:
+                await replica.pool_monitor.acquire(candidate)
+                db_ = candidate
+                break
+            except (DBAPIError, OSError, HTTPException) as e:
+                print(f"Replica unavailable, skipping for {REPLICA_RETRY_SECONDS}s: {e}")
+                replica.unhealthy_until = time.monotonic() + REPLICA_RETRY_SECONDS
+                await candidate.close()
+
+        if db_ is None:
+            db_ = (self.ReadSessionLocal if autocommit else self.SessionLocal)()
+            await self.pool_monitor.acquire(db_)
+        try:
+            yield db_
+        finally:
+            await db_.close()
+
+    async def dispose(self):
+        await self.engine.dispose()
+        for replica in self.replicas:
+            await replica.engine.dispose()
+
     async def create_user(self, dbs, payloads):
-        """Create a new user asynchronously."""
+        """
+        Inserts the user in the caller's transaction; False if the email is taken.
+        A duplicate rolls the whole transaction back.
+        """
         try:
-            user = User(**payloads)
-            dbs.add(user)
-            await dbs.commit()
-            await dbs.refresh(user)
+            await dbs.execute(insert(User).values(**payloads))
             return True
         except IntegrityError:
             await dbs.rollback()
@@ -124,15 +380,188 @@ class SingletonDB:
         return user if return_result else user is not None
 
 
-db = SingletonDB(DATABASE_URL)
+db = SingletonDB(DATABASE_URL, DATABASE_REPLICA_URLS)
 if db.engine is None:
     raise RuntimeError("Database engine initialization failed!")
 
+def upsert(dbs: AsyncSession, model, values, index_elements: list, set_=None):
+    """
+    INSERT ... ON CONFLICT DO UPDATE for whichever dialect `dbs` is bound to.
+    `values` may be one row or a list of rows; `set_` may be a callable taking
+    the statement's `excluded` namespace. Without `set_` conflicting rows are
+    left alone (ON CONFLICT DO NOTHING).
+    """
+    dialect = postgresql if dbs.bind.dialect.name == "postgresql" else sqlite
+    stmt = dialect.insert(model).values(values)
+    if set_ is None:
+        return stmt.on_conflict_do_nothing(index_elements=index_elements)
+    if callable(set_):
+        set_ = set_(stmt.excluded)
+    return stmt.on_conflict_do_update(index_elements=index_elements, set_=set_)
+
+
+def on_commit(dbs: AsyncSession, callback):
+    """Runs `await callback()` once the session's current transaction commits."""
+    dbs.info.setdefault("on_commit", []).append(callback)
+
+
+async def commit(dbs: AsyncSession):
+    """Commits and then runs the callbacks registered with on_commit."""
+    await dbs.commit()
+    for callback in dbs.info.pop("on_commit", []):
+        await callback()
+
+
 async def get_db():
     async with db.get_db() as session:
         yield session
 
 
+async def get_read_db():
+    async with db.get_read_db() as session:
+        yield session
+
+
+def _widen_task_id_columns(sync_conn):
+    """
+    task_id used to be VARCHAR(6). Widen existing columns in place so ULIDs fit;
+    old 6-character ids stay valid. SQLite doesn't enforce lengths.
+    """
+    if sync_conn.dialect.name != "postgresql":
+        return
+    for table in ("user_tasks", "task_tombstones"):
+        length = sync_conn.execute(
+            text(
+                "SELECT character_maximum_length FROM information_schema.columns "
+                "WHERE table_name = :table AND column_name = 'task_id'"
+            ),
+            {"table": table},
+        ).scalar()
+        if length is not None and length < 26:
+            sync_conn.execute(
+                text(f"ALTER TABLE {table} ALTER COLUMN task_id TYPE VARCHAR(26)")
+            )
+
+
+def _widen_counter_names(sync_conn):
+    """user_task_counters.name used to be VARCHAR(255), too short for "status:<255 chars>"."""
+    if sync_conn.dialect.name != "postgresql":
+        return
+    length = sync_conn.execute(
+        text(
+            "SELECT character_maximum_length FROM information_schema.columns "
+            "WHERE table_name = 'user_task_counters' AND column_name = 'name'"
+        )
+    ).scalar()
+    if length is not None:
+        sync_conn.execute(text("ALTER TABLE user_task_counters ALTER COLUMN name TYPE TEXT"))
+
+
+# text search configuration used for the Postgres task search vector
+FTS_LANGUAGE = os.getenv("FTS_LANGUAGE", "english")
+
+
+def _create_search_index(sync_conn):
+    """
+    Full-text index over task title/description: a generated tsvector column
+    with a GIN index on Postgres, an external-content FTS5 table kept in sync by
+    triggers on SQLite.
+    """
+    if sync_conn.dialect.name == "postgresql":
+        sync_conn.execute(
+            text(
+                "ALTER TABLE user_tasks ADD COLUMN IF NOT EXISTS search_vector tsvector "
+                f"GENERATED ALWAYS AS (to_tsvector('{FTS_LANGUAGE}'::regconfig, "
+                "coalesce(title, '') || ' ' || coalesce(description, ''))) STORED"
+            )
+        )
+        # with btree_gin the index can also narrow by user_id
+        try:
+            with sync_conn.begin_nested():
+                sync_conn.execute(text("CREATE EXTENSION IF NOT EXISTS btree_gin"))
+            columns = "user_id, search_vector"
+        except DBAPIError:
+            columns = "search_vector"
+        sync_conn.execute(
+            text(
+                "CREATE INDEX IF NOT EXISTS ix_user_tasks_search "
+                f"ON user_tasks USING GIN ({columns})"
+            )
+        )
+    elif sync_conn.dialect.name == "sqlite":
+        exists = sync_conn.execute(
+            text("SELECT 1 FROM sqlite_master WHERE name = 'user_tasks_fts'")
+        ).scalar()
+        if exists:
+            return
+        for statement in (
+            "CREATE VIRTUAL TABLE user_tasks_fts USING fts5("
+            "title, description, content='user_tasks', content_rowid='rowid')",
+            "CREATE TRIGGER user_tasks_fts_ai AFTER INSERT ON user_tasks BEGIN "
+            "INSERT INTO user_tasks_fts(rowid, title, description) "
+            "VALUES (new.rowid, new.title, new.description); END",
+            "CREATE TRIGGER user_tasks_fts_ad AFTER DELETE ON user_tasks BEGIN "
+            "INSERT INTO user_tasks_fts(user_tasks_fts, rowid, title, description) "
+            "VALUES ('delete', old.rowid, old.title, old.description); END",
+            "CREATE TRIGGER user_tasks_fts_au AFTER UPDATE ON user_tasks BEGIN "
+            "INSERT INTO user_tasks_fts(user_tasks_fts, rowid, title, description) "
+            "VALUES ('delete', old.rowid, old.title, old.description); "
+            "INSERT INTO user_tasks_fts(rowid, title, description) "
+            "VALUES (new.rowid, new.title, new.description); END",
+            # index rows that existed before the table
+            "INSERT INTO user_tasks_fts(user_tasks_fts) VALUES ('rebuild')",
+        ):
+            sync_conn.execute(text(statement))
+
+
+def _backfill_task_counters(sync_conn):
+    # first boot with the counters table: seed it from existing tasks once
+    if sync_conn.execute(select(UserTaskCounter.user_id).limit(1)).first() is None:
+        sync_conn.execute(
+            insert(UserTaskCounter).from_select(
+                ["user_id", "name", "count"], task_counter_source()
+            )
+        )
+
+
+def _migrate_collection_state(sync_conn):
+    # create_all doesn't add columns to tables that already exist
+    columns = {c["name"] for c in inspect(sync_conn).get_columns("task_collection_state")}
+    if "version" not in columns:
+        sync_conn.execute(
+            text(
+                "ALTER TABLE task_collection_state "
+                "ADD COLUMN version INTEGER NOT NULL DEFAULT 0"
+            )
+        )
+    if "deletions" in columns:
+        # superseded by version; NOT NULL without a server default, so new
+        # rows would fail while it exists
+        sync_conn.execute(text("ALTER TABLE task_collection_state DROP COLUMN deletions"))
+
+
+def _create_missing_indexes(sync_conn):
+    # create_all skips indexes on tables that already exist
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(sync_conn, checkfirst=True)
+
+
+# arbitrary constant shared by every process that runs DDL
+SCHEMA_LOCK_KEY = 7_316_021
+
+
 async def init_db():
     async with db.engine.begin() as conn:
+        if conn.dialect.name == "postgresql":
+            # serialize concurrent boots; released when this transaction ends
+            await conn.execute(
+                text("SELECT pg_advisory_xact_lock(:key)"), {"key": SCHEMA_LOCK_KEY}
+            )
         await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(_widen_task_id_columns)
+        await conn.run_sync(_migrate_collection_state)
+        await conn.run_sync(_widen_counter_names)
+        await conn.run_sync(_create_missing_indexes)
+        await conn.run_sync(_create_search_index)
+        await conn.run_sync(_backfill_task_counters)
@@ -0,0 +1,72 @@
+import base64
+import json
+from datetime import datetime
+
+from fastapi import HTTPException
+from sqlalchemy import tuple_
+
+from .model import UserTasks
+
+
+TASK_SORTS = {
+    "duedate": UserTasks.duedate,
+    "created_at": UserTasks.created_at,
+    "last_modified": UserTasks.last_modified,
+}
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+
+
+def encode_cursor(value: datetime, task_id: str) -> str:
+    raw = json.dumps([value.isoformat(), task_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, str]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        value, task_id = json.loads(base64.urlsafe_b64decode(padded))
+        return datetime.fromisoformat(value), str(task_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def parse_sort(sort: str):
+    """`duedate` sorts ascending, `-duedate` descending; task_id breaks ties."""
+    descending = sort.startswith("-")
+    column = TASK_SORTS.get(sort.lstrip("-"))
+    if column is None:
+        raise HTTPException(
+            status_code=400,
+            detail=f"sort must be one of {', '.join(TASK_SORTS)} (prefix '-' for desc)",
+        )
+    return column, descending
+
+
+def paginate_tasks(stmt, sort: str, cursor: str | None, limit: int):
+    """Applies ordering, the keyset predicate for `cursor` and limit+1 to `stmt`."""
+    column, descending = parse_sort(sort)
+
+    if cursor:
+        value, task_id = decode_cursor(cursor)
+        key = tuple_(column, UserTasks.task_id)
+        stmt = stmt.where(
+            key < tuple_(value, task_id) if descending else key > tuple_(value, task_id)
+        )
+
+    if descending:
+        stmt = stmt.order_by(column.desc(), UserTasks.task_id.desc())
+    else:
+        stmt = stmt.order_by(column.asc(), UserTasks.task_id.asc())
+
+    # one extra row tells us whether there is a next page
+    return stmt.limit(limit + 1), column
+
+
+def next_page(rows: list, column, limit: int):
+    """Trims the look-ahead row and returns (rows, next_cursor)."""
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor(getattr(last, column.key), last.task_id)
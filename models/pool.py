@@ -0,0 +1,87 @@
+import os
+import time
+
+from fastapi import HTTPException
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+def _env_bool(name: str, default: str) -> bool:
+    return os.getenv(name, default).lower() in ("1", "true", "yes")
+
+
+def engine_options(url: str) -> dict:
+    """create_async_engine kwargs, driven by DB_* environment variables."""
+    options = {
+        "echo": _env_bool("DB_ECHO", "false"),
+        # off by default: a ping is an extra round trip on every checkout;
+        # pool_recycle retires connections before servers drop idle ones
+        "pool_pre_ping": _env_bool("DB_POOL_PRE_PING", "false"),
+    }
+    if not url.startswith("sqlite"):
+        options.update(
+            pool_size=int(os.getenv("DB_POOL_SIZE", "5")),
+            max_overflow=int(os.getenv("DB_MAX_OVERFLOW", "10")),
+            pool_timeout=float(os.getenv("DB_POOL_TIMEOUT", "30")),
+            pool_recycle=int(os.getenv("DB_POOL_RECYCLE", "1800")),
+        )
+    if "+asyncpg" in url:
+        options["connect_args"] = {
+            "statement_cache_size": int(os.getenv("DB_STATEMENT_CACHE_SIZE", "100"))
+        }
+    return options
+
+
+class PoolMonitor:
+    """Counts pool activity from SQLAlchemy pool events and times connection checkout."""
+
+    def __init__(self, engine):
+        self.pool = engine.sync_engine.pool
+        self.stats = {
+            "connects": 0,
+            "checkouts": 0,
+            "checkins": 0,
+            "invalidations": 0,
+            "checkout_timeouts": 0,
+            "wait_seconds_total": 0.0,
+            "wait_seconds_max": 0.0,
+        }
+        event.listen(self.pool, "connect", self._count("connects"))
+        event.listen(self.pool, "checkout", self._count("checkouts"))
+        event.listen(self.pool, "checkin", self._count("checkins"))
+        event.listen(self.pool, "invalidate", self._count("invalidations"))
+
+    def _count(self, key):
+        def listener(*args):
+            self.stats[key] += 1
+
+        return listener
+
+    async def acquire(self, session: AsyncSession):
+        """Checks out the session's connection up front so the wait can be measured."""
+        start = time.perf_counter()
+        try:
+            await session.connection()
+        except PoolTimeoutError:
+            self.stats["checkout_timeouts"] += 1
+            raise HTTPException(
+                status_code=503,
+                detail="Database busy, please retry shortly",
+                headers={"Retry-After": "1"},
+            )
+        finally:
+            waited = time.perf_counter() - start
+            self.stats["wait_seconds_total"] += waited
+            self.stats["wait_seconds_max"] = max(self.stats["wait_seconds_max"], waited)
+
+    def snapshot(self) -> dict:
+        snapshot = {"pool": type(self.pool).__name__, **self.stats}
+        # QueuePool exposes sizing; SQLite's pools don't
+        for name in ("size", "checkedin", "checkedout", "overflow"):
+            fn = getattr(self.pool, name, None)
+            if callable(fn):
+                snapshot[name] = fn()
+        if "checkedin" in snapshot:
+            snapshot["idle"] = snapshot.pop("checkedin")
+        return snapshot
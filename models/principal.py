@@ -0,0 +1,110 @@
+import os
+
+from fastapi import Depends, HTTPException, Request
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from utility.cache import TTLCache
+from utility.read_pin import PrimaryPin
+from .model import READ_YOUR_WRITES_SECONDS, User, db
+from .utils import get_current_user
+
+
+# user id -> {"id", "email", "username", "is_verified"}
+principal_cache = TTLCache(
+    maxsize=int(os.getenv("PRINCIPAL_CACHE_SIZE", "10000")),
+    ttl=float(os.getenv("PRINCIPAL_CACHE_TTL_SECONDS", "300")),
+)
+# email -> user id, only needed while pre-rollout (email-only) tokens are around
+_legacy_ids = TTLCache(maxsize=principal_cache.maxsize, ttl=principal_cache.ttl)
+# signed cookie keeping a client's reads on the primary right after it writes
+primary_pin = PrimaryPin(os.getenv("SECRET_KEY"), READ_YOUR_WRITES_SECONDS)
+
+
+def _to_principal(user: User) -> dict:
+    return {
+        "id": user.id,
+        "email": user.email,
+        "username": user.username,
+        "is_verified": user.is_verified,
+    }
+
+
+def cache_principal(user: User) -> dict:
+    principal = _to_principal(user)
+    principal_cache.set(user.id, principal)
+    return principal
+
+
+def invalidate_principal(user_id: int):
+    principal_cache.pop(user_id)
+
+
+def clear_principals():
+    principal_cache.clear()
+    _legacy_ids.clear()
+
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _drop_changed_user(mapper, connection, target):
+    invalidate_principal(target.id)
+    _legacy_ids.pop(target.email)
+
+
+async def get_current_principal(
+    request: Request, user: dict = Depends(get_current_user)
+) -> dict:
+    """
+    Resolves the caller to at least {"id", "email"}.
+    Tokens issued with a `uid` claim need no query at all; older email-only
+    tokens are resolved once and then served from the cache.
+    Non-GET requests pin the caller's reads to the primary for a short while
+    (PrimaryPinMiddleware turns the mark into a cookie).
+    """
+    principal = await _resolve(user)
+    if db.replicas and request.method not in ("GET", "HEAD"):
+        request.state.pin_primary = principal["id"]
+    return principal
+
+
+def reads_from_primary(request: Request, user_id) -> bool:
+    """True while the caller's pin cookie from a recent write is still valid."""
+    return bool(db.replicas) and primary_pin.is_pinned(request, user_id)
+
+
+async def get_user_read_db(request: Request, user: dict = Depends(get_current_principal)):
+    """Read-only session for GET handlers; honours the caller's primary pin."""
+    async with db.get_read_db(reads_from_primary(request, user["id"])) as session:
+        yield session
+
+
+async def _resolve(user: dict) -> dict:
+    if user.get("id") is not None:
+        return user
+
+    user_id = _legacy_ids.get(user["email"])
+    if user_id is not None:
+        return {**user, "id": user_id}
+
+    # no request session here, so GET handlers don't hold a primary connection
+    async with db.get_read_db() as dbs:
+        result = await dbs.execute(select(User).filter(User.email == user["email"]))
+        existing = result.scalar_one_or_none()
+    if existing is None:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+
+    _legacy_ids.set(existing.email, existing.id)
+    return cache_principal(existing)
+
+
+async def load_principal(dbs: AsyncSession, user_id: int) -> dict | None:
+    """Full principal (including username) for `user_id`, from cache when possible."""
+    principal = principal_cache.get(user_id)
+    if principal is not None:
+        return principal
+
+    result = await dbs.execute(select(User).filter(User.id == user_id))
+    user = result.scalar_one_or_none()
+    return cache_principal(user) if user else None
@@ -0,0 +1,121 @@
+import os
+import time
+from datetime import datetime, timezone, timedelta
+
+from sqlalchemy import delete
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from utility.periodic import run_periodically
+from .model import RevokedToken, as_utc, db, on_commit, upsert
+
+
+REVOCATION_SYNC_SECONDS = float(os.getenv("REVOCATION_SYNC_SECONDS", "10"))
+REVOCATION_CLEANUP_SECONDS = float(os.getenv("REVOCATION_CLEANUP_SECONDS", "3600"))
+# rows committed slightly out of revoked_at order are still picked up
+REVOCATION_SETTLE_SECONDS = 5
+
+
+class RevocationList:
+    """
+    Revoked token ids held in memory, so checking a request is a dict lookup.
+
+    Revocations made by this worker apply as soon as they commit; other
+    workers pick them up from the revoked_tokens table within
+    REVOCATION_SYNC_SECONDS. Entries are dropped once the token has expired.
+    """
+
+    def __init__(self):
+        self._revoked = {}  # jti -> expiry (unix seconds)
+        self._synced_through = None  # newest revoked_at seen in the table
+        self.syncs = 0
+
+    def is_revoked(self, jti) -> bool:
+        return jti in self._revoked
+
+    def __len__(self):
+        return len(self._revoked)
+
+    async def revoke(self, dbs: AsyncSession, jti: str, user_id, expires_at: float):
+        """
+        Records the revocation in the caller's transaction; revoking an
+        already revoked token (e.g. two logouts racing) is a no-op.
+        """
+        await dbs.execute(
+            upsert(
+                dbs,
+                RevokedToken,
+                {
+                    "jti": jti,
+                    "user_id": user_id,
+                    "expires_at": datetime.fromtimestamp(expires_at, timezone.utc),
+                },
+                index_elements=["jti"],
+            )
+        )
+
+        async def apply():
+            self._revoked[jti] = expires_at
+
+        on_commit(dbs, apply)
+
+    async def sync(self):
+        """Loads revocations recorded since the last sync (all unexpired ones at first)."""
+        now = datetime.now(timezone.utc)
+        stmt = select(RevokedToken.jti, RevokedToken.expires_at, RevokedToken.revoked_at)
+        if self._synced_through is None:
+            stmt = stmt.where(RevokedToken.expires_at > now)
+        else:
+            stmt = stmt.where(
+                RevokedToken.revoked_at
+                >= self._synced_through - timedelta(seconds=REVOCATION_SETTLE_SECONDS)
+            )
+
+        async with db.get_read_db() as dbs:
+            rows = (await dbs.execute(stmt)).all()
+
+        for jti, expires_at, revoked_at in rows:
+            self._revoked[jti] = as_utc(expires_at).timestamp()
+            revoked_at = as_utc(revoked_at)
+            if self._synced_through is None or revoked_at > self._synced_through:
+                self._synced_through = revoked_at
+        if self._synced_through is None:
+            # empty table; later syncs only need what is revoked from now on
+            self._synced_through = now
+        self.syncs += 1
+        self.prune()
+
+    def prune(self):
+        now = datetime.now(timezone.utc).timestamp()
+        for jti in [jti for jti, expiry in self._revoked.items() if expiry <= now]:
+            del self._revoked[jti]
+
+    async def delete_expired(self) -> int:
+        async with db.get_db() as dbs:
+            result = await dbs.execute(
+                delete(RevokedToken).where(
+                    RevokedToken.expires_at <= datetime.now(timezone.utc)
+                )
+            )
+            return result.rowcount
+
+    async def sync_forever(self):
+        """Started from the app lifespan after the initial sync()."""
+        last_cleanup = 0.0
+
+        async def sync_and_clean_up():
+            nonlocal last_cleanup
+            await self.sync()
+            if time.monotonic() - last_cleanup >= REVOCATION_CLEANUP_SECONDS:
+                await self.delete_expired()
+                last_cleanup = time.monotonic()
+
+        await run_periodically(
+            sync_and_clean_up,
+            REVOCATION_SYNC_SECONDS,
+            "Token revocation sync",
+            initial_delay=REVOCATION_SYNC_SECONDS,
+        )
+
+
+revocations = RevocationList()
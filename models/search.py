@@ -0,0 +1,46 @@
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from .model import FTS_LANGUAGE, UserTasks
+
+
+MAX_SEARCH_OFFSET = 1000
+# mapped columns only, so the Postgres search_vector column isn't fetched
+_TASK_COLUMNS = ", ".join(f"user_tasks.{column.name}" for column in UserTasks.__table__.columns)
+
+
+def _fts5_query(query: str) -> str:
+    # quote every term so user input can't use FTS5 operators or break the parser
+    return " ".join('"' + term.replace('"', '""') + '"' for term in query.split())
+
+
+async def search_tasks(
+    dbs: AsyncSession, user_id: int, query: str, limit: int, offset: int
+) -> list:
+    """The user's tasks matching `query`, best match first; fetches limit+1 rows."""
+    params = {"user_id": user_id, "limit": limit + 1, "offset": offset}
+
+    if dbs.bind.dialect.name == "postgresql":
+        stmt = text(
+            f"SELECT {_TASK_COLUMNS} FROM user_tasks, "
+            f"websearch_to_tsquery('{FTS_LANGUAGE}'::regconfig, :query) AS query "
+            "WHERE user_tasks.user_id = :user_id AND search_vector @@ query "
+            "ORDER BY ts_rank_cd(search_vector, query) DESC, user_tasks.task_id "
+            "LIMIT :limit OFFSET :offset"
+        )
+        params["query"] = query
+    else:
+        stmt = text(
+            f"SELECT {_TASK_COLUMNS} FROM user_tasks_fts "
+            "JOIN user_tasks ON user_tasks.rowid = user_tasks_fts.rowid "
+            "WHERE user_tasks_fts MATCH :query AND user_tasks.user_id = :user_id "
+            "ORDER BY bm25(user_tasks_fts), user_tasks.task_id "
+            "LIMIT :limit OFFSET :offset"
+        )
+        params["query"] = _fts5_query(query)
+
+    result = await dbs.execute(
+        select(UserTasks).from_statement(stmt.bindparams(**params))
+    )
+    return result.scalars().all()
@@ -0,0 +1,107 @@
+import asyncio
+from collections import Counter
+from datetime import datetime, timezone
+
+from sqlalchemy import delete, func, insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from .model import UserTaskCounter, UserTasks, db, task_counter_source, upsert
+
+
+STAT_FIELDS = ("status", "is_completed", "is_favor")
+
+
+def counter_names(task) -> list:
+    """Counters a task with these attributes contributes to; accepts a dict or row."""
+    get = task.get if isinstance(task, dict) else lambda key: getattr(task, key)
+    names = ["total", f"status:{get('status')}"]
+    if get("is_completed") == "yes":
+        names.append("completed")
+    if get("is_favor"):
+        names.append("favorite")
+    return names
+
+
+def task_deltas(added=(), removed=()) -> Counter:
+    deltas = Counter()
+    for task in added:
+        deltas.update(counter_names(task))
+    for task in removed:
+        deltas.subtract(counter_names(task))
+    return deltas
+
+
+async def apply_counter_deltas(dbs: AsyncSession, user_id: int, deltas: Counter):
+    """One multi-row upsert in the caller's transaction; zero deltas are skipped."""
+    rows = [
+        {"user_id": user_id, "name": name, "count": delta}
+        for name, delta in deltas.items()
+        if delta
+    ]
+    if not rows:
+        return
+    await dbs.execute(
+        upsert(
+            dbs,
+            UserTaskCounter,
+            rows,
+            index_elements=["user_id", "name"],
+            set_=lambda excluded: {"count": UserTaskCounter.count + excluded["count"]},
+        )
+    )
+
+
+async def read_task_stats(dbs: AsyncSession, user_id: int) -> dict:
+    result = await dbs.execute(
+        select(UserTaskCounter.name, UserTaskCounter.count).where(
+            UserTaskCounter.user_id == user_id
+        )
+    )
+    counters = dict(result.all())
+
+    # "overdue" depends on the clock, so it can't be kept as a counter; this
+    # is a range count on the (user_id, duedate, task_id) index instead
+    overdue = await dbs.execute(
+        select(func.count()).where(
+            UserTasks.user_id == user_id,
+            UserTasks.duedate < datetime.now(timezone.utc),
+            UserTasks.is_completed != "yes",
+        )
+    )
+
+    return {
+        "total": counters.get("total", 0),
+        "completed": counters.get("completed", 0),
+        "favorite": counters.get("favorite", 0),
+        "overdue": overdue.scalar_one(),
+        "by_status": {
+            name.removeprefix("status:"): count
+            for name, count in counters.items()
+            if name.startswith("status:") and count
+        },
+    }
+
+
+async def recompute_task_stats(dbs: AsyncSession, user_id: int | None = None):
+    """Rebuilds counters from user_tasks with GROUP BY, for one user or everyone."""
+    stmt = delete(UserTaskCounter)
+    if user_id is not None:
+        stmt = stmt.where(UserTaskCounter.user_id == user_id)
+    await dbs.execute(stmt)
+    await dbs.execute(
+        insert(UserTaskCounter).from_select(
+            ["user_id", "name", "count"], task_counter_source(user_id)
+        )
+    )
+
+
+async def _repair_all():
+    async with db.get_db() as dbs:
+        await recompute_task_stats(dbs)
+    await db.dispose()
+
+
+if __name__ == "__main__":
+    # python -m models.stats: repair drift for every user
+    asyncio.run(_repair_all())
@@ -0,0 +1,187 @@
+import base64
+import hashlib
+import json
+import os
+from datetime import datetime, timezone, timedelta
+
+from fastapi import HTTPException, Request
+from sqlalchemy import delete, insert, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from utility.periodic import run_periodically
+from .model import (
+    TaskCollectionState,
+    TaskTombstone,
+    UserTasks,
+    as_utc,
+    db,
+    upsert,
+    utcnow,
+)
+
+
+TOMBSTONE_RETENTION_DAYS = int(os.getenv("TOMBSTONE_RETENTION_DAYS", "30"))
+TOMBSTONE_PRUNE_INTERVAL_SECONDS = int(
+    os.getenv("TOMBSTONE_PRUNE_INTERVAL_SECONDS", "3600")
+)
+# the feed cursor never moves closer than this to "now", so rows stamped by
+# transactions that were still open during a read are picked up next time
+CHANGES_SETTLE_SECONDS = int(os.getenv("CHANGES_SETTLE_SECONDS", "5"))
+
+
+async def bump_collection_version(dbs: AsyncSession, user_id: int):
+    """
+    Moves the user's task-list version forward in the caller's transaction;
+    every task write calls this exactly once.
+    """
+    await dbs.execute(
+        upsert(
+            dbs,
+            TaskCollectionState,
+            {"user_id": user_id, "version": 1},
+            index_elements=["user_id"],
+            set_={"version": TaskCollectionState.version + 1},
+        )
+    )
+
+
+async def record_deletions(dbs: AsyncSession, user_id: int, task_ids: list):
+    """Writes tombstones and bumps the collection version in the caller's transaction."""
+    if not task_ids:
+        return
+    await dbs.execute(
+        insert(TaskTombstone),
+        [{"user_id": user_id, "task_id": task_id} for task_id in task_ids],
+    )
+    await bump_collection_version(dbs, user_id)
+
+
+async def collection_version(dbs: AsyncSession, user_id: int) -> int:
+    """The user's task-list version; a primary-key lookup of one row."""
+    result = await dbs.execute(
+        select(TaskCollectionState.version).where(TaskCollectionState.user_id == user_id)
+    )
+    return result.scalar_one_or_none() or 0
+
+
+async def collection_etag(dbs: AsyncSession, user_id: int, variant: str = "") -> str:
+    """
+    Weak ETag for the user's task list, derived from the maintained version.
+    Timestamps can't be used: they may be too coarse (whole seconds on
+    SQLite) or earlier than the commit (Postgres now() is transaction start).
+    """
+    version = await collection_version(dbs, user_id)
+    tag = f"{user_id}|{version}|{variant}"
+    return 'W/"' + hashlib.sha1(tag.encode()).hexdigest()[:20] + '"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # weak comparison: W/"x" and "x" match
+    tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return etag.removeprefix("W/") in tags
+
+
+def encode_sync_cursor(position: dict) -> str:
+    raw = json.dumps(position, default=str).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_sync_cursor(cursor: str) -> dict:
+    """Returns {"tasks": (ts, task_id) | None, "deleted": (ts, tombstone_id) | None}."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        raw = json.loads(base64.urlsafe_b64decode(padded))
+        return {
+            name: (as_utc(datetime.fromisoformat(raw[name][0])), raw[name][1])
+            if raw.get(name)
+            else None
+            for name in ("tasks", "deleted")
+        }
+    except (ValueError, TypeError, KeyError, IndexError, AttributeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+async def changes_since(dbs: AsyncSession, user_id: int, since: str | None, limit: int):
+    """
+    Tasks modified and tasks deleted after `since`, oldest first.
+    Returns (tasks, tombstones, next_cursor, has_more); a missing `since` means
+    "from the beginning".
+
+    Both streams are paged by their own (timestamp, id) key, so large batches
+    that share one timestamp are never split or skipped.
+    """
+    now = as_utc((await dbs.execute(select(utcnow()))).scalar_one())
+    settled = now - timedelta(seconds=CHANGES_SETTLE_SECONDS)
+    position = decode_sync_cursor(since) if since else {"tasks": None, "deleted": None}
+
+    horizon = now - timedelta(days=TOMBSTONE_RETENTION_DAYS)
+    if position["deleted"] and position["deleted"][0] < horizon:
+        # tombstones older than the horizon are gone; the client must resync
+        raise HTTPException(status_code=410, detail="Cursor expired, full resync required")
+
+    task_stmt = select(UserTasks).where(
+        UserTasks.user_id == user_id, UserTasks.last_modified <= settled
+    )
+    if position["tasks"]:
+        task_stmt = task_stmt.where(
+            tuple_(UserTasks.last_modified, UserTasks.task_id)
+            > tuple_(*position["tasks"])
+        )
+    tasks = (
+        await dbs.execute(
+            task_stmt.order_by(UserTasks.last_modified, UserTasks.task_id).limit(limit + 1)
+        )
+    ).scalars().all()
+
+    tomb_stmt = select(TaskTombstone).where(
+        TaskTombstone.user_id == user_id, TaskTombstone.deleted_at <= settled
+    )
+    if position["deleted"]:
+        tomb_stmt = tomb_stmt.where(
+            tuple_(TaskTombstone.deleted_at, TaskTombstone.id)
+            > tuple_(*position["deleted"])
+        )
+    tombstones = (
+        await dbs.execute(
+            tomb_stmt.order_by(TaskTombstone.deleted_at, TaskTombstone.id).limit(limit + 1)
+        )
+    ).scalars().all()
+
+    tombstones_cut = len(tombstones) > limit
+    has_more = len(tasks) > limit or tombstones_cut
+    tasks, tombstones = tasks[:limit], tombstones[:limit]
+
+    if tasks:
+        position["tasks"] = (tasks[-1].last_modified, tasks[-1].task_id)
+    if tombstones:
+        position["deleted"] = (tombstones[-1].deleted_at, tombstones[-1].id)
+    if not tombstones_cut and (
+        not position["deleted"] or as_utc(position["deleted"][0]) < settled
+    ):
+        # every tombstone up to `settled` has been seen; moving the position
+        # forward keeps idle-but-active clients clear of the retention horizon
+        position["deleted"] = (settled, 0)
+
+    return tasks, tombstones, encode_sync_cursor(position), has_more
+
+
+async def prune_tombstones() -> int:
+    cutoff = datetime.now(timezone.utc) - timedelta(days=TOMBSTONE_RETENTION_DAYS)
+    async with db.get_db() as dbs:
+        result = await dbs.execute(
+            delete(TaskTombstone).where(TaskTombstone.deleted_at < cutoff)
+        )
+        return result.rowcount
+
+
+async def prune_tombstones_forever():
+    """Started from the app lifespan; deletes tombstones past the retention window."""
+    await run_periodically(
+        prune_tombstones, TOMBSTONE_PRUNE_INTERVAL_SECONDS, "Tombstone pruning"
+    )
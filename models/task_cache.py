@@ -0,0 +1,58 @@
+import os
+
+from utility.cache import MemoryCacheBackend, SingleFlight
+
+
+TASK_CACHE_TTL_SECONDS = float(os.getenv("TASK_CACHE_TTL_SECONDS", "30"))
+TASK_CACHE_MAX_ENTRIES = int(os.getenv("TASK_CACHE_MAX_ENTRIES", "10000"))
+TASK_CACHE_MAX_BYTES = int(os.getenv("TASK_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+
+class TaskListCache:
+    """
+    Serialized task-list pages keyed by (user, collection ETag).
+
+    The ETag is derived from the version every task write bumps in the
+    database, so whichever worker cached a page, it is only ever served
+    while it is still current; writes need no invalidation step.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.flight = SingleFlight()
+        self.hits = 0
+        self.misses = 0
+
+    async def get_or_load(self, user_id, etag: str, loader):
+        """Cached page body for (user, etag); concurrent misses share one `loader()` call."""
+        key = f"tasks:{user_id}:{etag}"
+        cached = await self.backend.get(key)
+        if cached is not None:
+            self.hits += 1
+            return cached
+        self.misses += 1
+
+        async def load():
+            value = await loader()
+            await self.backend.set(key, value)
+            return value
+
+        return await self.flight.do(key, load)
+
+    def snapshot(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "stampede_joins": self.flight.joined,
+            "evictions": getattr(self.backend, "evictions", 0),
+            "bytes": getattr(self.backend, "bytes", 0),
+        }
+
+
+task_list_cache = TaskListCache(
+    MemoryCacheBackend(
+        maxsize=TASK_CACHE_MAX_ENTRIES,
+        max_bytes=TASK_CACHE_MAX_BYTES,
+        ttl=TASK_CACHE_TTL_SECONDS,
+    )
+)
@@ -1,101 +1,405 @@
-from fastapi import Request, APIRouter, Depends, HTTPException, Response
-from fastapi.responses import JSONResponse
+import asyncio
+import json
+from datetime import datetime
+from fastapi import Request, APIRouter, Depends, HTTPException, Response, Query
+from fastapi.responses import JSONResponse, StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from sqlalchemy import delete
+from sqlalchemy import delete, insert, update
 
 # custom imports
-from rest_schema import Task, DeleteTask, UpdateTask
-from .model import User, UserTasks, db
+from rest_schema import (
+    Task,
+    DeleteTask,
+    UpdateTask,
+    TaskBatch,
+    TaskOut,
+    TaskPage,
+    TaskCreated,
+    TaskChanges,
+    TASK_ADAPTER,
+    TASK_PAGE_ADAPTER,
+    PARTIAL_TASK_PAGE_ADAPTER,
+    TASK_CREATED_ADAPTER,
+    TASK_CHANGES_ADAPTER,
+    TaskSearchResults,
+    TASK_SEARCH_ADAPTER,
+    json_response,
+)
+from .model import User, UserTasks, db, commit, utcnow
 from .utils import *
+from .principal import get_current_principal, get_user_read_db, reads_from_primary
+from .pagination import paginate_tasks, next_page, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from .export import export_response
+from .batch import apply_task_batch
+from .sync import (
+    bump_collection_version,
+    collection_etag,
+    etag_matches,
+    record_deletions,
+    changes_since,
+)
+from .task_cache import task_list_cache
+from .task_events import task_events
+from .search import search_tasks, MAX_SEARCH_OFFSET
+from .fieldsets import TASK_FIELDS, parse_fields, task_columns
+from .idempotency import idempotency_store
+from .stats import (
+    STAT_FIELDS,
+    apply_counter_deltas,
+    task_deltas,
+    read_task_stats,
+    recompute_task_stats,
+)
 
 
 task_router = APIRouter()
 
 
-@task_router.get("/")
-async def task_test(user: dict = Depends(get_current_user), dbs=Depends(get_db)):
+@task_router.get("/", response_model=TaskPage)
+async def task_test(
+    request: Request,
+    user: dict = Depends(get_current_principal),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: str | None = None,
+    sort: str = "duedate",
+    status: str | None = None,
+    is_completed: str | None = None,
+    is_favor: bool | None = None,
+    due_after: datetime | None = None,
+    due_before: datetime | None = None,
+    fields: str | None = None,
+):
+    """
+    Lists the caller's tasks one page at a time.
+    Pass the returned `next_cursor` back as `cursor` to get the next page.
+    `fields=task_id,title,...` selects only those columns (task_id and the
+    sort column are always included).
+    Pages are cached per user and collection version; a current
+    If-None-Match is answered with 304 without loading any rows.
+    """
 
     if not user:
         raise HTTPException(status_code=404, detail="Not Authorized")
 
-    user = await db.existing_user(dbs, user["email"], return_result=True)
+    user_id = user["id"]
+    variant = request.url.query
+
+    sort_key = sort.lstrip("-")
+    columns = parse_fields(fields, TASK_FIELDS, required=("task_id", sort_key))
+    if columns is None:
+        stmt = select(UserTasks)
+    else:
+        # a real projection: unrequested columns are never read or sent
+        stmt = select(*task_columns(columns))
+    stmt = stmt.where(UserTasks.user_id == user_id)
+    if status is not None:
+        stmt = stmt.where(UserTasks.status == status)
+    if is_completed is not None:
+        stmt = stmt.where(UserTasks.is_completed == is_completed)
+    if is_favor is not None:
+        stmt = stmt.where(UserTasks.is_favor == is_favor)
+    if due_after is not None:
+        stmt = stmt.where(UserTasks.duedate >= due_after)
+    if due_before is not None:
+        stmt = stmt.where(UserTasks.duedate < due_before)
+    stmt, sort_column = paginate_tasks(stmt, sort, cursor, limit)
+
+    async with db.get_read_db(reads_from_primary(request, user_id)) as dbs:
+        # one-row version lookup on every request, so a page cached by any
+        # worker is never served after a write
+        etag = await collection_etag(dbs, user_id, variant=variant)
+        headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+        if etag_matches(request, etag):
+            return Response(status_code=304, headers=headers)
+
+        async def load_page():
+            all_tasks = await dbs.execute(stmt)
+            if columns is not None:
+                tasks, next_cursor = next_page(all_tasks.all(), sort_column, limit)
+                page = PARTIAL_TASK_PAGE_ADAPTER.validate_python(
+                    {"data": [row._asdict() for row in tasks], "next_cursor": next_cursor}
+                )
+                return PARTIAL_TASK_PAGE_ADAPTER.dump_json(page)
+
+            tasks, next_cursor = next_page(
+                all_tasks.scalars().all(), sort_column, limit
+            )
+            page = TASK_PAGE_ADAPTER.validate_python(
+                {"data": tasks, "next_cursor": next_cursor}, from_attributes=True
+            )
+            return TASK_PAGE_ADAPTER.dump_json(page)
+
+        body = await task_list_cache.get_or_load(user_id, etag, load_page)
+
+    return Response(content=body, headers=headers, media_type="application/json")
+
+
+@task_router.get("/changes", response_model=TaskChanges)
+async def task_changes(
+    user: dict = Depends(get_current_principal),
+    dbs=Depends(get_user_read_db),
+    since: str | None = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+):
+    """
+    Delta sync feed: tasks changed and task ids deleted since `since`.
+    Keep calling with the returned `cursor` while `has_more` is true; a 410
+    means the cursor is older than tombstone retention and a full reload is needed.
+    """
+
+    tasks, tombstones, cursor, has_more = await changes_since(
+        dbs, user["id"], since, limit
+    )
+    return json_response(
+        TASK_CHANGES_ADAPTER,
+        {"data": tasks, "deleted": tombstones, "cursor": cursor, "has_more": has_more},
+    )
+
+
+@task_router.get("/search", response_model=TaskSearchResults)
+async def task_search(
+    user: dict = Depends(get_current_principal),
+    dbs=Depends(get_user_read_db),
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0, le=MAX_SEARCH_OFFSET),
+):
+    """Full-text search over the caller's task titles and descriptions, ranked."""
+
+    q = q.strip()
+    if not q:
+        # nothing to match; FTS5 rejects an empty MATCH outright
+        return json_response(TASK_SEARCH_ADAPTER, {"data": [], "next_offset": None})
+
+    tasks = await search_tasks(dbs, user["id"], q, limit, offset)
+    next_offset = offset + limit if len(tasks) > limit else None
+    return json_response(
+        TASK_SEARCH_ADAPTER, {"data": tasks[:limit], "next_offset": next_offset}
+    )
+
+
+@task_router.get("/events")
+async def task_event_stream(request: Request, user: dict = Depends(get_current_principal)):
+    """
+    Server-Sent Events feed of the caller's task changes from any device.
+    Events are `created`, `updated`, `deleted`, or `resync` when this
+    connection fell too far behind and should reload its list.
+    """
+
+    subscription = task_events.broker.subscribe(user["id"])
+
+    async def stream():
+        try:
+            yield "retry: 5000\n\n"
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(subscription.get(), timeout=25)
+                except asyncio.TimeoutError:
+                    # keeps proxies from closing an idle connection
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+        finally:
+            task_events.broker.unsubscribe(subscription)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@task_router.get("/stats")
+async def task_stats(
+    user: dict = Depends(get_current_principal),
+    dbs=Depends(get_user_read_db),
+):
+    """Totals for the caller's dashboard, read from maintained counters."""
+
+    return await read_task_stats(dbs, user["id"])
+
+
+@task_router.post("/stats/rebuild")
+async def rebuild_task_stats(
+    user: dict = Depends(get_current_principal),
+    dbs: AsyncSession = Depends(get_db),
+):
+    """Recomputes the caller's counters from their tasks, fixing any drift."""
+
+    await recompute_task_stats(dbs, user["id"])
+    stats = await read_task_stats(dbs, user["id"])
+    await commit(dbs)
+    return stats
 
-    all_tasks = await dbs.execute(select(UserTasks).where(UserTasks.user_id == user.id))
-    tasks = all_tasks.scalars().all()
-    return {"data": tasks}
 
+@task_router.get("/export")
+async def export_tasks(
+    request: Request, user: dict = Depends(get_current_principal), format: str = "ndjson"
+):
+    """Streams all of the caller's tasks as NDJSON or CSV."""
 
-@task_router.post("/")
+    stmt = (
+        select(*UserTasks.__table__.columns)
+        .where(UserTasks.user_id == user["id"])
+        .order_by(UserTasks.created_at, UserTasks.task_id)
+    )
+    return export_response(
+        stmt, format, "tasks", primary=reads_from_primary(request, user["id"])
+    )
+
+
+@task_router.post("/", response_model=TaskCreated)
 async def create_task(
     *,
-    user: dict = Depends(get_current_user),
+    request: Request,
+    user: dict = Depends(get_current_principal),
     task: Task,
     dbs: AsyncSession = Depends(get_db)
 ):
-    """Add a new user task"""
+    """Add a new user task. Retries carrying the same Idempotency-Key get the first response back."""
 
-    existing_user = await db.existing_user(dbs, user["email"], return_result=True)
+    return await idempotency_store.run(
+        request, dbs, user["id"], lambda: _create_task(dbs, user["id"], task)
+    )
 
-    user_id = existing_user.id
 
+async def _create_task(dbs: AsyncSession, user_id: int, task: Task):
     # Create the task with a valid user_id
     task_data = {**task.model_dump(), "user_id": user_id}
 
-    new_task = UserTasks(**task_data)
-    dbs.add(new_task)
-    await dbs.commit()
-    await dbs.refresh(new_task)
+    # RETURNING hands back the server-filled timestamps, no refresh needed
+    result = await dbs.execute(insert(UserTasks).values(**task_data).returning(UserTasks))
+    new_task = result.scalar_one()
+    await apply_counter_deltas(dbs, user_id, task_deltas(added=[task_data]))
+    await bump_collection_version(dbs, user_id)
+    await task_events.emit(dbs, user_id, [{"type": "created", "task_id": task.task_id}])
 
-    return {"message": "Task created successfully", "task": new_task}
+    return json_response(
+        TASK_CREATED_ADAPTER,
+        {"message": "Task created successfully", "task": new_task},
+    )
 
 
 @task_router.delete("/")
-async def remove_task(task: DeleteTask, dbs: AsyncSession = Depends(get_db)):
+async def remove_task(
+    *,
+    request: Request,
+    user: dict = Depends(get_current_principal),
+    task: DeleteTask,
+    dbs: AsyncSession = Depends(get_db)
+):
 
-    result = await dbs.execute(
-        select(UserTasks).filter(UserTasks.task_id == task.task_id)
+    return await idempotency_store.run(
+        request, dbs, user["id"], lambda: _remove_task(dbs, user["id"], task)
     )
 
-    task = result.scalar_one_or_none()
 
-    if not task:
-        raise HTTPException(status_code=402, detail="Task not exists")
+async def _remove_task(dbs: AsyncSession, user_id: int, task: DeleteTask):
+    # single round trip; the user_id filter keeps callers to their own tasks
+    result = await dbs.execute(
+        delete(UserTasks)
+        .where(UserTasks.task_id == task.task_id, UserTasks.user_id == user_id)
+        .returning(UserTasks.task_id, *(getattr(UserTasks, f) for f in STAT_FIELDS))
+    )
+
+    removed = result.one_or_none()
+    if removed is None:
+        raise HTTPException(status_code=404, detail="Task not exists")
 
-    await dbs.execute(delete(UserTasks).where(UserTasks.task_id == task.task_id))
-    await dbs.commit()
+    await apply_counter_deltas(dbs, user_id, task_deltas(removed=[removed]))
+    await record_deletions(dbs, user_id, [task.task_id])
+    await task_events.emit(dbs, user_id, [{"type": "deleted", "task_id": task.task_id}])
     return {"message": "Task Deleted!"}
 
 
-@task_router.post("/modify")
+@task_router.post("/modify", response_model=TaskOut)
 async def update_task(
     *,
-    user: dict = Depends(get_current_user),
+    request: Request,
+    user: dict = Depends(get_current_principal),
     task: UpdateTask,
     dbs: AsyncSession = Depends(get_db)
 ):
-    existing_user = await db.existing_user(dbs, user["email"], return_result=True)
-
-    user_id = existing_user.id
-    task_id = task.task_id
-
-    result = await dbs.execute(select(UserTasks).where(UserTasks.task_id == task_id))
+    return await idempotency_store.run(
+        request, dbs, user["id"], lambda: _update_task(dbs, user["id"], task)
+    )
 
-    prevtask = result.scalar_one_or_none()
 
-    if not prevtask:
+async def _update_task(dbs: AsyncSession, user_id: int, task: UpdateTask):
+    # Update fields only if they are provided
+    update_data = task.model_dump(exclude_unset=True, exclude={"task_id"})
+
+    matches = (UserTasks.task_id == task.task_id, UserTasks.user_id == user_id)
+    stmt = (
+        update(UserTasks)
+        .values(**update_data, last_modified=utcnow())
+        .returning(UserTasks)
+        .execution_options(synchronize_session=False)
+    )
+    stat_columns = [getattr(UserTasks, field) for field in STAT_FIELDS]
+
+    previous = None
+    if not update_data.keys() & set(STAT_FIELDS):
+        updated_task = (await dbs.execute(stmt.where(*matches))).scalar_one_or_none()
+    elif dbs.bind.dialect.name == "postgresql":
+        # counters need the old values: one statement locks the row, reads
+        # them and applies the update
+        old = (
+            select(UserTasks.task_id, *stat_columns)
+            .where(*matches)
+            .with_for_update()
+            .subquery("old")
+        )
+        row = (
+            await dbs.execute(
+                stmt.where(UserTasks.task_id == old.c.task_id).returning(
+                    *(old.c[field] for field in STAT_FIELDS)
+                )
+            )
+        ).one_or_none()
+        updated_task = row[0] if row else None
+        if row:
+            previous = dict(zip(STAT_FIELDS, row[1:]))
+    else:
+        # SQLite can't RETURNING columns of an UPDATE's FROM list; its writers
+        # are serialized, so reading the old values first is just as exact
+        previous = (await dbs.execute(select(*stat_columns).where(*matches))).one_or_none()
+        updated_task = (await dbs.execute(stmt.where(*matches))).scalar_one_or_none()
+
+    if not updated_task:
         raise HTTPException(status_code=404, detail="Task not exists")
 
-    # Update fields only if they are provided
-    update_data = task.model_dump(exclude_unset=True)
-    for key, value in update_data.items():
-        setattr(prevtask, key, value)
+    if previous is not None:
+        await apply_counter_deltas(
+            dbs, user_id, task_deltas(added=[updated_task], removed=[previous])
+        )
+    await bump_collection_version(dbs, user_id)
+    await task_events.emit(dbs, user_id, [{"type": "updated", "task_id": task.task_id}])
 
-    # Commit the changes
-    await dbs.commit()
-    await dbs.refresh(prevtask)  # Refresh instance with updated data
+    return json_response(TASK_ADAPTER, updated_task)
 
-    return prevtask
+
+@task_router.post("/batch")
+async def batch_tasks(
+    *,
+    user: dict = Depends(get_current_principal),
+    batch: TaskBatch,
+    dbs: AsyncSession = Depends(get_db)
+):
+    """Applies many task creates/updates/deletes in a single transaction."""
+
+    results = await apply_task_batch(dbs, user["id"], batch)
+    await task_events.emit(
+        dbs,
+        user["id"],
+        [
+            {"type": result["status"], "task_id": result["task_id"]}
+            for result in results
+            if result["status"] in ("created", "updated", "deleted")
+        ],
+    )
+    return {"message": "Batch applied", "results": results}
 
 
 @task_router.options("/")
@@ -0,0 +1,129 @@
+import asyncio
+import json
+import os
+
+from sqlalchemy import func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from utility.broker import InProcessBroker
+from .model import db, on_commit
+
+
+# "memory" delivers within this worker only; "postgres" fans out through LISTEN/NOTIFY
+TASK_EVENTS_BACKEND = os.getenv("TASK_EVENTS_BACKEND", "memory")
+TASK_EVENTS_BUFFER = int(os.getenv("TASK_EVENTS_BUFFER", "100"))
+TASK_EVENTS_CHANNEL = "task_events"
+# how often the LISTEN connection is checked, and re-subscribed once it dropped
+TASK_EVENTS_PING_SECONDS = float(os.getenv("TASK_EVENTS_PING_SECONDS", "15"))
+# Postgres rejects NOTIFY payloads of 8000 bytes or more
+NOTIFY_PAYLOAD_LIMIT = 7900
+
+
+class TaskEventHub:
+    def __init__(self, backend: str, buffer_size: int):
+        self.backend = backend
+        self.broker = InProcessBroker(buffer_size)
+        self._listen_conn = None
+        self._driver_conn = None
+        self._watch_task = None
+        self.reconnects = 0
+
+    async def start(self):
+        if self.backend != "postgres":
+            return
+        await self._subscribe()
+        self._watch_task = asyncio.create_task(self._watch())
+
+    async def stop(self):
+        if self._watch_task is not None:
+            self._watch_task.cancel()
+            try:
+                await self._watch_task
+            except asyncio.CancelledError:
+                pass
+            self._watch_task = None
+        if self._listen_conn is not None:
+            await self._listen_conn.close()
+            self._listen_conn = None
+
+    async def _subscribe(self):
+        # one dedicated connection per worker receives every notification
+        self._listen_conn = await db.engine.connect()
+        raw = await self._listen_conn.get_raw_connection()
+        self._driver_conn = raw.driver_connection
+        await self._driver_conn.add_listener(TASK_EVENTS_CHANNEL, self._on_notify)
+
+    async def _watch(self):
+        """
+        Pings the LISTEN connection and, once it is gone, subscribes again on a
+        fresh one. Notifications sent while it was down are lost; clients catch
+        up through the changes feed.
+        """
+        while True:
+            await asyncio.sleep(TASK_EVENTS_PING_SECONDS)
+            try:
+                if self._driver_conn.is_closed():
+                    raise ConnectionError("connection closed")
+                await asyncio.wait_for(
+                    self._driver_conn.execute("SELECT 1"), TASK_EVENTS_PING_SECONDS
+                )
+                continue
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Task event listener lost its connection, re-subscribing: {e}")
+
+            try:
+                # never hand the dead connection back to the pool
+                await self._listen_conn.invalidate()
+                await self._listen_conn.close()
+                await self._subscribe()
+                self.reconnects += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Task event listener re-subscribe failed: {e}")
+
+    def _on_notify(self, connection, pid, channel, payload):
+        for event in json.loads(payload):
+            self.broker.deliver(event["user_id"], event)
+
+    async def emit(self, dbs: AsyncSession, user_id: int, events: list):
+        """
+        Publishes events once `dbs` commits. With Postgres, NOTIFY is queued in
+        the transaction itself, so rolled-back writes never announce anything;
+        the events go out as one JSON array per NOTIFY, split only where a
+        payload would exceed Postgres's size limit.
+        """
+        events = [{**event, "user_id": user_id} for event in events]
+        if not events:
+            return
+
+        if self.backend == "postgres":
+            for payload in _notify_payloads(events):
+                await dbs.execute(select(func.pg_notify(TASK_EVENTS_CHANNEL, payload)))
+            return
+
+        async def deliver():
+            for event in events:
+                self.broker.deliver(user_id, event)
+
+        on_commit(dbs, deliver)
+
+
+def _notify_payloads(events: list):
+    """JSON arrays of `events`, each kept under NOTIFY_PAYLOAD_LIMIT bytes."""
+    chunk, size = [], 2  # the brackets
+    for event in events:
+        encoded = json.dumps(event, default=str)
+        if chunk and size + len(encoded.encode()) + 1 > NOTIFY_PAYLOAD_LIMIT:
+            yield f"[{','.join(chunk)}]"
+            chunk, size = [], 2
+        chunk.append(encoded)
+        size += len(encoded.encode()) + 1
+    if chunk:
+        yield f"[{','.join(chunk)}]"
+
+
+task_events = TaskEventHub(TASK_EVENTS_BACKEND, TASK_EVENTS_BUFFER)
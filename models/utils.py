@@ -2,15 +2,16 @@ import re
 import random
 import string
 from email.message import EmailMessage
-import aiosmtplib
 import jwt
 import secrets
-from passlib.context import CryptContext
 from datetime import datetime, timezone, timedelta
 from fastapi import Request, Response, HTTPException
 from dotenv import load_dotenv
 import os
 from .model import *
+from utility.hashing import hasher, pwd_context
+from utility.ids import new_ulid
+from .revocation import revocations
 
 # load environment variables
 load_dotenv()
@@ -20,15 +21,13 @@ ALGORITHM = "HS256"
 TOKEN_EXPIRE_IN_DAYS = 7
 
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+async def validate_password(plain_pwd: str, hashed_pwd) -> tuple[bool, str | None]:
+    """Verifies off the event loop; also returns a new hash if the stored one is deprecated."""
+    return await hasher.verify(plain_pwd, hashed_pwd)
 
 
-def validate_password(plain_pwd: str, hashed_pwd) -> bool:
-    return pwd_context.verify(plain_pwd, hashed_pwd)
-
-
-def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
+async def hash_password(password: str) -> str:
+    return await hasher.hash(password)
 
 
 def validate_email(email: str) -> bool:
@@ -41,7 +40,7 @@ def generate_token(length: int = 6) -> str:
     return "".join(random.choices(string.ascii_uppercase + string.digits, k=length))
 
 
-async def send_verification_email(recipient_email, user_name, token):
+def build_verification_email(recipient_email, user_name, token) -> EmailMessage:
 
     verification_link = f"{os.getenv('APP_URL')}?token={token}"
 
@@ -105,48 +104,53 @@ async def send_verification_email(recipient_email, user_name, token):
 
     msg.add_alternative(html_content, subtype="html")
 
-    # SMTP Configuration
-    # smtp_server = "smtp.gmail.com"
-    # smtp_port = 587
-    # smtp_username = os.getenv("SENDER_EMAIL_ID")
+    return msg
 
-    try:
-        await aiosmtplib.send(
-            msg,
-            hostname=os.getenv("SMTP_SERVER"),
-            port=os.getenv("SMTP_PORT"),
-            username=os.getenv("SENDER_EMAIL_ID"),
-            password=os.getenv("SENDER_EMAIL_PASSWORD"),
-            use_tls=False,
-            start_tls=True,
-        )
-        return True
-    except Exception as e:
-        print(e)
-        return False
-
-
-def generate_jwt_token(email: str):
+
+def generate_jwt_token(email: str, user_id: int, is_verified: bool):
     expire = datetime.now(timezone.utc) + timedelta(days=TOKEN_EXPIRE_IN_DAYS)
 
-    payload = {"sub": email, "expire": expire.timestamp()}
+    payload = {
+        "sub": email,
+        "uid": user_id,
+        "verified": is_verified,
+        "jti": new_ulid(),
+        # "exp" is enforced by jwt.decode; "expire" is kept for older clients
+        "exp": int(expire.timestamp()),
+        "expire": expire.timestamp(),
+    }
 
     token = jwt.encode(payload=payload, key=SECRET_KEY, algorithm=ALGORITHM)
 
     return token
 
 
-def get_current_user(request: Request):
+def read_token_claims(request: Request) -> dict | None:
+    """The auth cookie's claims if it holds a valid token, else None."""
     token = request.cookies.get("taskease_token")
+    if not token:
+        return None
+    try:
+        return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except jwt.InvalidTokenError:
+        return None
+
 
-    print("Token", token)
-    print("-----------------------------------------------------------------")
+def get_current_user(request: Request):
+    token = request.cookies.get("taskease_token")
 
     if not token:
         raise HTTPException(status_code=401, detail="Not authenticated")
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        return {"email": payload.get("sub")}
+        if revocations.is_revoked(payload.get("jti")):
+            raise HTTPException(status_code=401, detail="Token revoked")
+        # "uid" is missing from tokens issued before it was added
+        return {
+            "email": payload.get("sub"),
+            "id": payload.get("uid"),
+            "is_verified": payload.get("verified"),
+        }
     except jwt.ExpiredSignatureError:
         raise HTTPException(status_code=401, detail="Token expired")
     except jwt.InvalidTokenError:
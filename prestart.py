@@ -0,0 +1,20 @@
+"""
+One-off schema setup run before the production workers start (see start.sh),
+so N workers don't each repeat the DDL checks on boot.
+"""
+
+import asyncio
+import time
+
+from models import db, init_db
+
+
+async def main():
+    started = time.perf_counter()
+    await init_db()
+    await db.dispose()
+    print(f"Schema ready in {(time.perf_counter() - started) * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1 +1,2 @@
 from .schema import *
+from .serializers import json_response
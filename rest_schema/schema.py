@@ -1,7 +1,8 @@
-from pydantic import BaseModel
-from typing import Optional
+import os
+from pydantic import BaseModel, Field, TypeAdapter
+from typing import Any, Optional, Literal, Union, Annotated
 from datetime import datetime,timezone
-import uuid
+from utility.ids import new_task_id, ULID_LENGTH
 from typing import Optional
 class UserRegister(BaseModel):
     username: str
@@ -32,13 +33,14 @@ class LoginSchema(BaseModel):
 
 
 class Task(BaseModel):
-    task_id : str = str(uuid.uuid4())[:6]
+    # default_factory: a plain default would be evaluated once, at import
+    task_id : str = Field(default_factory=new_task_id, max_length=ULID_LENGTH)
     title : str = "No Title"
     description : str = ""
     status : str ="low"
     is_completed:str = "no"
     is_favor:bool = False 
-    duedate:datetime = datetime.now(timezone.utc)
+    duedate:datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     color:str = "blue"
 
 
@@ -54,4 +56,105 @@ class UpdateTask(BaseModel):
     is_completed: Optional[str] = None
     is_favor: Optional[bool] = None
     duedate: Optional[datetime] = None
-    color: Optional[str] = None
\ No newline at end of file
+    color: Optional[str] = None
+
+
+class CreateTaskOp(BaseModel):
+    op: Literal["create"]
+    task: Task
+
+
+class UpdateTaskOp(BaseModel):
+    op: Literal["update"]
+    task: UpdateTask
+
+
+class DeleteTaskOp(BaseModel):
+    op: Literal["delete"]
+    task_id: str
+
+
+TASK_BATCH_MAX_SIZE = int(os.getenv("TASK_BATCH_MAX_SIZE", "500"))
+
+
+class TaskBatch(BaseModel):
+    # checked while parsing, so an oversized batch is rejected before all of it is validated
+    operations: list[
+        Annotated[Union[CreateTaskOp, UpdateTaskOp, DeleteTaskOp], Field(discriminator="op")]
+    ] = Field(max_length=TASK_BATCH_MAX_SIZE)
+
+
+class TaskOut(BaseModel):
+    task_id: str
+    user_id: int
+    title: str
+    description: str | None
+    status: str
+    created_at: datetime
+    last_modified: datetime
+    duedate: datetime
+    is_completed: str
+    is_favor: bool
+    color: str | None
+
+    class Config:
+        from_attributes = True
+
+
+class TaskPage(BaseModel):
+    data: list[TaskOut]
+    next_cursor: str | None = None
+
+
+class PartialTaskPage(BaseModel):
+    # rows projected by `fields=`; only the requested keys are present
+    data: list[dict[str, Any]]
+    next_cursor: str | None = None
+
+
+class TaskSearchResults(BaseModel):
+    data: list[TaskOut]
+    next_offset: int | None = None
+
+
+class TaskCreated(BaseModel):
+    message: str
+    task: TaskOut
+
+
+class Tombstone(BaseModel):
+    task_id: str
+    deleted_at: datetime
+
+    class Config:
+        from_attributes = True
+
+
+class TaskChanges(BaseModel):
+    data: list[TaskOut]
+    deleted: list[Tombstone]
+    cursor: str
+    has_more: bool
+
+
+class UserList(BaseModel):
+    status_code: int
+    message: str
+    data: list[UserSchema]
+
+
+class PartialUserList(BaseModel):
+    status_code: int
+    message: str
+    data: list[dict[str, Any]]
+
+
+# built once at import so each response skips schema construction
+TASK_ADAPTER = TypeAdapter(TaskOut)
+TASK_PAGE_ADAPTER = TypeAdapter(TaskPage)
+PARTIAL_TASK_PAGE_ADAPTER = TypeAdapter(PartialTaskPage)
+TASK_CREATED_ADAPTER = TypeAdapter(TaskCreated)
+TASK_CHANGES_ADAPTER = TypeAdapter(TaskChanges)
+TASK_SEARCH_ADAPTER = TypeAdapter(TaskSearchResults)
+USER_LIST_ADAPTER = TypeAdapter(UserList)
+PARTIAL_USER_LIST_ADAPTER = TypeAdapter(PartialUserList)
@@ -0,0 +1,18 @@
+from fastapi import Response
+from pydantic import TypeAdapter
+
+
+def json_response(
+    adapter: TypeAdapter, payload, status_code: int = 200, headers: dict | None = None
+) -> Response:
+    """
+    Validates `payload` (ORM objects allowed) against `adapter` and writes it
+    straight to JSON bytes, skipping FastAPI's jsonable_encoder pass.
+    """
+    content = adapter.dump_json(adapter.validate_python(payload, from_attributes=True))
+    return Response(
+        content=content,
+        status_code=status_code,
+        headers=headers,
+        media_type="application/json",
+    )
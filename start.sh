@@ -1,3 +1,18 @@
 #!/bin/bash
+set -e
 
-uvicorn main:app --host 0.0.0.0 --port $PORT --reload
\ No newline at end of file
+if [ "$APP_ENV" = "production" ]; then
+    # schema once, then N workers that skip it
+    python prestart.py
+    export SKIP_DB_INIT=1
+    # trust X-Forwarded-For from the load balancer (set FORWARDED_ALLOW_IPS to
+    # its address, or "*" if only it can reach us) so per-IP rate limits see
+    # the real client instead of the proxy
+    exec uvicorn main:app --host 0.0.0.0 --port $PORT \
+        --proxy-headers --forwarded-allow-ips "${FORWARDED_ALLOW_IPS:-127.0.0.1}" \
+        --workers "${WEB_CONCURRENCY:-$(nproc)}" \
+        --loop uvloop --http httptools \
+        --timeout-graceful-shutdown "${GRACEFUL_TIMEOUT:-30}"
+else
+    uvicorn main:app --host 0.0.0.0 --port $PORT --reload
+fi
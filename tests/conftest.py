@@ -0,0 +1,121 @@
+"""
+Runs the app in-process against a scratch SQLite database.
+
+Needs httpx, aiosqlite and aiosmtpd on top of requirements.txt:
+
+    python -m pytest -q
+"""
+
+import os
+import secrets
+import socket
+import tempfile
+
+import pytest
+
+_tmpdir = tempfile.mkdtemp()
+os.environ.setdefault("DATABASE_ENDPOINT", f"sqlite+aiosqlite:///{_tmpdir}/test.db")
+os.environ.setdefault("SECRET_KEY", secrets.token_hex(32))
+os.environ["CHANGES_SETTLE_SECONDS"] = "0"
+# verification emails go to the local aiosmtpd server below; the long poll
+# means a delivery only arrives promptly if the outbox worker was woken
+with socket.socket() as _sock:
+    _sock.bind(("127.0.0.1", 0))
+    SMTP_PORT = _sock.getsockname()[1]
+os.environ["SMTP_SERVER"] = "127.0.0.1"
+os.environ["SMTP_PORT"] = str(SMTP_PORT)
+os.environ["SMTP_START_TLS"] = "false"
+os.environ.pop("SENDER_EMAIL_PASSWORD", None)
+os.environ.setdefault("APP_URL", "https://test.local/verify")
+os.environ.setdefault("SENDER_EMAIL_ID", "tests@taskease.local")
+os.environ["OUTBOX_POLL_SECONDS"] = "30"
+for _name in (
+    "LOGIN_RATE_PER_IP",
+    "LOGIN_RATE_PER_ACCOUNT",
+    "REGISTER_RATE_PER_IP",
+    "REGISTER_RATE_PER_ACCOUNT",
+    "VERIFY_EMAIL_RATE_PER_IP",
+):
+    os.environ[_name] = "0"
+
+import httpx  # noqa: E402
+from aiosmtpd.controller import Controller  # noqa: E402
+
+from main import app  # noqa: E402
+from models import db, generate_jwt_token  # noqa: E402
+
+
+# one event loop and one app lifespan for the whole run; the app keeps
+# module-level asyncio state (outbox worker, listeners)
+@pytest.fixture(scope="session")
+def anyio_backend():
+    return "asyncio"
+
+
+class Inbox:
+    """aiosmtpd handler keeping every message with the client port it came in on."""
+
+    def __init__(self):
+        self.messages = []  # (client port, envelope)
+
+    async def handle_DATA(self, server, session, envelope):
+        self.messages.append((session.peer[1], envelope))
+        return "250 OK"
+
+    def to(self, address: str) -> list:
+        return [(port, envelope) for port, envelope in self.messages if address in envelope.rcpt_tos]
+
+
+@pytest.fixture(scope="session")
+def smtp_inbox():
+    inbox = Inbox()
+    controller = Controller(inbox, hostname="127.0.0.1", port=SMTP_PORT)
+    controller.start()
+    yield inbox
+    controller.stop()
+
+
+@pytest.fixture(scope="session")
+async def app_running(anyio_backend, smtp_inbox):
+    async with app.router.lifespan_context(app):
+        yield app
+
+
+@pytest.fixture
+async def client(app_running):
+    # https so the Secure auth cookie is sent back
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app_running), base_url="https://test.local"
+    ) as client:
+        yield client
+
+
+@pytest.fixture
+def sign_in(client):
+    """Creates a verified user and logs `client` in as them; returns {"id", "email"}."""
+
+    async def sign_in():
+        email = f"user-{secrets.token_hex(4)}@example.com"
+        async with db.get_db() as dbs:
+            await db.create_user(
+                dbs,
+                {
+                    "username": email.split("@")[0],
+                    "email": email,
+                    "password": "unused",
+                    "is_verified": True,
+                },
+            )
+        async with db.get_read_db() as dbs:
+            existing = await db.existing_user(dbs, email, return_result=True)
+
+        client.cookies.set("taskease_token", generate_jwt_token(email, existing.id, True))
+        return {"id": existing.id, "email": email}
+
+    return sign_in
+
+
+@pytest.fixture
+async def user(sign_in):
+    """A verified user; `client` is logged in as them."""
+    return await sign_in()
@@ -0,0 +1,84 @@
+import pytest
+
+from models.task_events import task_events
+from rest_schema import TASK_BATCH_MAX_SIZE
+from tests.test_sync import create_tasks
+
+pytestmark = pytest.mark.anyio
+
+
+async def batch(client, *operations):
+    return await client.post("/api/tasks/batch", json={"operations": list(operations)})
+
+
+def drain(subscription) -> list:
+    events = []
+    while not subscription.queue.empty():
+        events.append(subscription.queue.get_nowait())
+    return events
+
+
+async def test_mixed_batch_reports_each_operation(client, sign_in):
+    await sign_in()
+    (foreign,) = await create_tasks(client, 1)
+    user = await sign_in()
+    kept, edited, removed = await create_tasks(client, 3)
+    subscription = task_events.broker.subscribe(user["id"])
+
+    try:
+        response = await batch(
+            client,
+            {"op": "create", "task": {"title": "new", "status": "high", "is_favor": True}},
+            {"op": "update", "task": {"task_id": edited, "status": "high", "is_completed": "yes"}},
+            {"op": "update", "task": {"task_id": kept}},
+            {"op": "update", "task": {"task_id": foreign, "title": "not mine"}},
+            {"op": "delete", "task_id": removed},
+            {"op": "delete", "task_id": removed},
+            {"op": "delete", "task_id": "missing"},
+        )
+        events = drain(subscription)
+    finally:
+        task_events.broker.unsubscribe(subscription)
+
+    assert response.status_code == 200, response.text
+    results = response.json()["results"]
+    assert [(r["op"], r["status"]) for r in results] == [
+        ("create", "created"),
+        ("update", "updated"),
+        ("update", "unchanged"),
+        ("update", "not_found"),
+        ("delete", "deleted"),
+        ("delete", "not_found"),
+        ("delete", "not_found"),
+    ]
+    assert [(e["type"], e["task_id"]) for e in events] == [
+        ("created", results[0]["task_id"]),
+        ("updated", edited),
+        ("deleted", removed),
+    ]
+
+    stats = (await client.get("/api/tasks/stats")).json()
+    assert stats["total"] == 3
+    assert stats["completed"] == 1
+    assert stats["favorite"] == 1
+    assert stats["by_status"] == {"high": 2, "low": 1}
+    # the incremental counters agree with a full recount
+    assert stats == (await client.post("/api/tasks/stats/rebuild")).json()
+
+
+async def test_duplicate_task_ids_reject_the_whole_batch(client, user):
+    task = {"task_id": "dup-in-batch", "title": "twice"}
+
+    response = await batch(client, {"op": "create", "task": task}, {"op": "create", "task": task})
+
+    assert response.status_code == 409
+    assert (await client.get("/api/tasks/stats")).json()["total"] == 0
+
+
+async def test_oversized_batch_is_rejected_while_parsing(client, user):
+    operations = [{"op": "delete", "task_id": "x"}] * (TASK_BATCH_MAX_SIZE + 1)
+
+    response = await batch(client, *operations)
+
+    assert response.status_code == 422
+    assert response.json()["detail"][0]["type"] == "too_long"
@@ -0,0 +1,53 @@
+import pytest
+
+from tests.test_sync import create_tasks
+
+pytestmark = pytest.mark.anyio
+
+
+async def current_etag(client) -> str:
+    response = await client.get("/api/tasks/")
+    assert response.status_code == 200, response.text
+    return response.headers["etag"]
+
+
+async def test_unchanged_list_answers_304(client, user):
+    await create_tasks(client, 1)
+    etag = await current_etag(client)
+
+    response = await client.get("/api/tasks/", headers={"If-None-Match": etag})
+
+    assert response.status_code == 304
+
+
+async def test_modify_within_the_same_second_changes_the_etag(client, user):
+    [task_id] = await create_tasks(client, 1)
+    etag = await current_etag(client)
+
+    response = await client.post("/api/tasks/modify", json={"task_id": task_id, "title": "new"})
+    assert response.status_code == 200
+
+    response = await client.get("/api/tasks/", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+    assert response.json()["data"][0]["title"] == "new"
+
+
+async def test_create_delete_and_batch_change_the_etag(client, user):
+    [task_id] = await create_tasks(client, 1)
+    etags = [await current_etag(client)]
+
+    await create_tasks(client, 1)
+    etags.append(await current_etag(client))
+
+    await client.request("DELETE", "/api/tasks/", json={"task_id": task_id})
+    etags.append(await current_etag(client))
+
+    response = await client.post(
+        "/api/tasks/batch",
+        json={"operations": [{"op": "create", "task": {"title": "from batch"}}]},
+    )
+    assert response.status_code == 200, response.text
+    etags.append(await current_etag(client))
+
+    assert len(set(etags)) == len(etags)
@@ -0,0 +1,16 @@
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_user_export_requires_a_signed_in_caller(client):
+    response = await client.get("/api/users/export")
+
+    assert response.status_code == 401
+
+
+async def test_user_export_streams_for_a_signed_in_caller(client, user):
+    response = await client.get("/api/users/export")
+
+    assert response.status_code == 200
+    assert user["email"] in response.text
@@ -0,0 +1,142 @@
+import anyio
+import pytest
+from fastapi import HTTPException, Request
+from fastapi.responses import JSONResponse
+from sqlalchemy import func, select
+
+from models.idempotency import IdempotencyStore
+from models.model import UserTasks, db
+
+pytestmark = pytest.mark.anyio
+
+
+async def create(client, key: str, title: str = "once"):
+    return await client.post(
+        "/api/tasks/", json={"title": title}, headers={"Idempotency-Key": key}
+    )
+
+
+async def task_count(user_id: int) -> int:
+    async with db.get_read_db() as dbs:
+        return await dbs.scalar(
+            select(func.count()).select_from(UserTasks).where(UserTasks.user_id == user_id)
+        )
+
+
+def make_request(key: str, body: bytes = b"{}") -> Request:
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    scope = {
+        "type": "http",
+        "method": "POST",
+        "path": "/api/tasks/",
+        "query_string": b"",
+        "headers": [(b"idempotency-key", key.encode())],
+    }
+    return Request(scope, receive)
+
+
+async def insert_task(dbs, user_id: int, title: str):
+    await dbs.execute(
+        UserTasks.__table__.insert().values(
+            task_id=title, user_id=user_id, title=title, status="low"
+        )
+    )
+    return JSONResponse({"created": title})
+
+
+async def test_retry_is_answered_from_the_first_response(client, user):
+    first = await create(client, "retry-1")
+    second = await create(client, "retry-1")
+
+    assert second.status_code == first.status_code == 200
+    assert second.content == first.content
+    assert second.headers["idempotent-replayed"] == "true"
+    assert await task_count(user["id"]) == 1
+
+
+async def test_key_reused_for_a_different_request_is_rejected(client, user):
+    await create(client, "reused-1", title="first")
+
+    response = await create(client, "reused-1", title="second")
+
+    assert response.status_code == 422
+    assert await task_count(user["id"]) == 1
+
+
+async def test_key_still_in_progress_answers_409(user):
+    store = IdempotencyStore(maxsize=10, ttl=60, persist=False)
+    started, release = anyio.Event(), anyio.Event()
+
+    async def slow_operation():
+        started.set()
+        await release.wait()
+        return JSONResponse({})
+
+    async def first():
+        async with db.get_db() as dbs:
+            await store.run(make_request("busy"), dbs, user["id"], slow_operation)
+
+    async with anyio.create_task_group() as tg:
+        tg.start_soon(first)
+        await started.wait()
+        async with db.get_db() as dbs:
+            with pytest.raises(HTTPException) as error:
+                await store.run(make_request("busy"), dbs, user["id"], slow_operation)
+        release.set()
+
+    assert error.value.status_code == 409
+    assert error.value.headers == {"Retry-After": "1"}
+
+
+async def test_persisted_record_is_replayed_by_another_worker(user):
+    key = "persisted-1"
+    async with db.get_db() as dbs:
+        await IdempotencyStore(10, 60, persist=True).run(
+            make_request(key), dbs, user["id"], lambda: insert_task(dbs, user["id"], "p-1")
+        )
+
+    # a second store starts with an empty memory, like another worker
+    async with db.get_db() as dbs:
+        response = await IdempotencyStore(10, 60, persist=True).run(
+            make_request(key), dbs, user["id"], lambda: insert_task(dbs, user["id"], "p-2")
+        )
+
+    assert response.headers["idempotent-replayed"] == "true"
+    assert response.body == b'{"created":"p-1"}'
+    assert await task_count(user["id"]) == 1
+
+
+async def test_losing_a_persisted_race_answers_409_and_rolls_back(user):
+    key = "raced-1"
+    looked_up, winner_committed = anyio.Event(), anyio.Event()
+
+    async def loser():
+        async def operation():
+            # the key was looked up before the other worker committed it
+            looked_up.set()
+            await winner_committed.wait()
+            return await insert_task(dbs, user["id"], "loser")
+
+        with pytest.raises(HTTPException) as error:
+            async with db.get_db() as dbs:
+                await IdempotencyStore(10, 60, persist=True).run(
+                    make_request(key), dbs, user["id"], operation
+                )
+        assert error.value.status_code == 409
+
+    async with anyio.create_task_group() as tg:
+        tg.start_soon(loser)
+        await looked_up.wait()
+        async with db.get_db() as dbs:
+            await IdempotencyStore(10, 60, persist=True).run(
+                make_request(key), dbs, user["id"], lambda: insert_task(dbs, user["id"], "winner")
+            )
+        winner_committed.set()
+
+    async with db.get_read_db() as dbs:
+        titles = (
+            await dbs.scalars(select(UserTasks.title).where(UserTasks.user_id == user["id"]))
+        ).all()
+    assert titles == ["winner"]
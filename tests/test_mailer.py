@@ -0,0 +1,101 @@
+import secrets
+import socket
+from datetime import datetime, timedelta, timezone
+
+import anyio
+import pytest
+from sqlalchemy import func, select, update
+
+from models import mailer
+from models.mailer import OutboxWorker, outbox_worker, queue_verification_email
+from models.model import EmailOutbox, db
+
+pytestmark = pytest.mark.anyio
+
+
+async def wait_for_mail(inbox, address: str, timeout: float = 5) -> list:
+    with anyio.fail_after(timeout):
+        while not inbox.to(address):
+            await anyio.sleep(0.01)
+    return inbox.to(address)
+
+
+async def test_queued_mail_is_delivered_right_after_commit(smtp_inbox):
+    addresses = [f"new-{secrets.token_hex(4)}@example.com" for _ in range(2)]
+    # what register-user does, minus the password hashing
+    async with db.get_db() as dbs:
+        for address in addresses:
+            await queue_verification_email(dbs, address, "someone", secrets.token_hex(3).upper())
+        outbox_worker.notify_on_commit(dbs)
+
+    # well inside OUTBOX_POLL_SECONDS, so the worker was woken by the commit
+    (first,), (second,) = [await wait_for_mail(smtp_inbox, address) for address in addresses]
+
+    assert b"?token=" in first[1].content
+    # both went out on the worker's one long-lived SMTP connection
+    assert first[0] == second[0]
+
+
+async def test_same_token_is_not_queued_again_within_the_cooldown(user):
+    token = secrets.token_hex(3).upper()
+    async with db.get_db() as dbs:
+        assert await queue_verification_email(dbs, user["email"], "someone", token)
+        await dbs.flush()
+        assert not await queue_verification_email(dbs, user["email"], "someone", token)
+
+    async with db.get_read_db() as dbs:
+        queued = await dbs.scalar(
+            select(func.count()).select_from(EmailOutbox).where(EmailOutbox.token == token)
+        )
+    assert queued == 1
+
+
+@pytest.fixture
+async def outbox_paused():
+    # keeps the app's worker from delivering the rows a test drives by hand
+    await outbox_worker.stop()
+    yield
+    outbox_worker.start()
+
+
+async def test_failed_sends_back_off_then_give_up(user, outbox_paused, monkeypatch):
+    monkeypatch.setattr(mailer, "OUTBOX_MAX_ATTEMPTS", 3)
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        closed_port = sock.getsockname()[1]
+    worker = OutboxWorker(db.SessionLocal, batch_size=100, poll_seconds=0)
+    worker.smtp.port = closed_port
+
+    token = secrets.token_hex(3).upper()
+    async with db.get_db() as dbs:
+        await queue_verification_email(dbs, user["email"], "someone", token)
+
+    async def row():
+        async with db.get_read_db() as dbs:
+            result = await dbs.execute(select(EmailOutbox).where(EmailOutbox.token == token))
+            return result.scalar_one()
+
+    for attempt in (1, 2):
+        before = datetime.now(timezone.utc)
+        await worker.deliver_batch()
+        message = await row()
+        assert (message.status, message.attempts) == ("pending", attempt)
+        assert message.last_error
+        delay = message.next_attempt_at.replace(tzinfo=timezone.utc) - before
+        assert timedelta(seconds=2**attempt) <= delay < timedelta(seconds=2**attempt + 5)
+
+        # not due yet: another pass leaves it alone
+        await worker.deliver_batch()
+        assert (await row()).attempts == attempt
+
+        async with db.get_db() as dbs:
+            await dbs.execute(
+                update(EmailOutbox)
+                .where(EmailOutbox.token == token)
+                .values(next_attempt_at=datetime.now(timezone.utc) - timedelta(seconds=1))
+            )
+
+    await worker.deliver_batch()
+    message = await row()
+    assert (message.status, message.attempts) == ("failed", 3)
+    await worker.stop()
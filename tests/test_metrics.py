@@ -0,0 +1,23 @@
+import pytest
+
+from utility.metrics import REQUESTS_TOTAL
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.mark.parametrize(
+    "path, label",
+    [
+        ("/api/tasks/stats", "/api/tasks/stats"),
+        ("/api/tasks/", "/api/tasks/"),
+        ("/api/auth/me", "/api/auth/me"),
+        ("/no/such/route", "unmatched"),
+    ],
+)
+async def test_route_label_includes_the_router_prefix(client, user, path, label):
+    before = REQUESTS_TOTAL.values.copy()
+
+    response = await client.get(path)
+
+    key = ("GET", label, response.status_code)
+    assert REQUESTS_TOTAL.values[key] == before.get(key, 0) + 1
@@ -0,0 +1,39 @@
+import pytest
+
+from tests.test_sync import create_tasks
+
+pytestmark = pytest.mark.anyio
+
+
+async def list_all(client, **params) -> list:
+    seen, cursor, pages = [], None, 0
+    while True:
+        query = {"limit": 2, **params, **({"cursor": cursor} if cursor else {})}
+        response = await client.get("/api/tasks/", params=query)
+        assert response.status_code == 200, response.text
+        body = response.json()
+        seen += [task["task_id"] for task in body["data"]]
+        cursor = body["next_cursor"]
+        pages += 1
+        assert pages <= 10, "cursor did not advance"
+        if cursor is None:
+            return seen
+
+
+@pytest.mark.parametrize("sort", ["created_at", "-created_at", "last_modified", "-last_modified"])
+async def test_keyset_pages_cover_every_task_once(client, user, sort):
+    task_ids = await create_tasks(client, 5)
+
+    seen = await list_all(client, sort=sort)
+
+    assert len(seen) == len(task_ids)
+    assert set(seen) == set(task_ids)
+
+
+async def test_pages_match_a_single_full_page(client, user):
+    await create_tasks(client, 5)
+
+    response = await client.get("/api/tasks/", params={"sort": "-created_at", "limit": 500})
+    one_page = [task["task_id"] for task in response.json()["data"]]
+
+    assert await list_all(client, sort="-created_at") == one_page
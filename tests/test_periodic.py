@@ -0,0 +1,24 @@
+import anyio
+import pytest
+
+from utility.periodic import run_periodically
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_a_failing_run_does_not_stop_the_loop():
+    runs = []
+
+    async def job():
+        runs.append(len(runs))
+        if len(runs) == 1:
+            raise RuntimeError("first run fails")
+
+    with anyio.move_on_after(1):
+        async with anyio.create_task_group() as tg:
+            tg.start_soon(run_periodically, job, 0, "Test job")
+            while len(runs) < 3:
+                await anyio.sleep(0)
+            tg.cancel_scope.cancel()
+
+    assert runs[:3] == [0, 1, 2]
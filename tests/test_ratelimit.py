@@ -0,0 +1,23 @@
+import pytest
+
+from models.model import db
+from utility.ratelimit import login_limiter
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_throttled_login_never_checks_out_a_connection(client, monkeypatch):
+    monkeypatch.setattr(login_limiter, "per_account", (1 / 60, 1))
+    sessions = []
+    factory = db.SessionLocal
+    monkeypatch.setattr(db, "SessionLocal", lambda: sessions.append(1) or factory())
+    credentials = {"email": "throttled@example.com", "password": "wrong-password"}
+
+    first = await client.post("/api/auth/login", json=credentials)
+    opened = len(sessions)
+    second = await client.post("/api/auth/login", json=credentials)
+
+    assert first.status_code == 401
+    assert second.status_code == 429
+    assert "retry-after" in second.headers
+    assert len(sessions) == opened == 1
@@ -0,0 +1,45 @@
+import os
+
+import pytest
+
+from models.model import ReplicaEngine, db
+from models.principal import primary_pin
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def replica(monkeypatch):
+    # the test database doubles as the replica; only the routing is checked
+    replica = ReplicaEngine(os.environ["DATABASE_ENDPOINT"])
+    replica.reads = 0
+    factory = replica.ReadSessionLocal
+
+    def counting_factory():
+        replica.reads += 1
+        return factory()
+
+    replica.ReadSessionLocal = counting_factory
+    monkeypatch.setattr(db, "replicas", [replica])
+    yield replica
+    await replica.engine.dispose()
+
+
+async def test_reads_after_a_write_go_to_the_primary(client, user, replica):
+    await client.get("/api/tasks/")
+    assert replica.reads == 1
+
+    created = await client.post("/api/tasks/", json={"title": "pinned", "status": "low"})
+    assert primary_pin.cookie_name in created.cookies
+
+    await client.get("/api/tasks/")
+    assert replica.reads == 1
+
+
+async def test_a_forged_pin_is_ignored(client, user, replica):
+    forged = primary_pin.cookie_value(user["id"]).rsplit(".", 1)[0] + ".0"
+    client.cookies.set(primary_pin.cookie_name, forged)
+
+    await client.get("/api/tasks/")
+
+    assert replica.reads == 1
@@ -0,0 +1,28 @@
+import time
+
+import pytest
+from sqlalchemy import func, select
+
+from models.model import RevokedToken, commit, db
+from models.revocation import revocations
+from utility.ids import new_ulid
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_revoking_a_token_twice_is_a_no_op(user):
+    jti = new_ulid()
+    expires_at = time.time() + 60
+
+    # e.g. two logouts with the same cookie, served by different workers
+    for _ in range(2):
+        async with db.get_db() as dbs:
+            await revocations.revoke(dbs, jti, user["id"], expires_at)
+            await commit(dbs)
+
+    async with db.get_read_db() as dbs:
+        count = await dbs.scalar(
+            select(func.count()).select_from(RevokedToken).where(RevokedToken.jti == jti)
+        )
+    assert count == 1
+    assert revocations.is_revoked(jti)
@@ -0,0 +1,59 @@
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+
+async def add_task(client, title, description=None):
+    task = {"title": title, **({"description": description} if description else {})}
+    response = await client.post("/api/tasks/", json=task)
+    assert response.status_code == 200, response.text
+    return response.json()["task"]["task_id"]
+
+
+async def search(client, **params):
+    response = await client.get("/api/tasks/search", params=params)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+async def test_best_match_comes_first(client, user):
+    weak = await add_task(client, "groceries", "also buy one kiwi and lots else besides")
+    strong = await add_task(client, "kiwi kiwi", "kiwi")
+    await add_task(client, "unrelated")
+
+    found = [task["task_id"] for task in (await search(client, q="kiwi"))["data"]]
+
+    assert found == [strong, weak]
+
+
+async def test_only_the_callers_tasks_are_searched(client, sign_in):
+    await sign_in()
+    await add_task(client, "quince jam")
+    owner = await sign_in()
+    mine = await add_task(client, "quince tart")
+
+    body = await search(client, q="quince")
+
+    assert [task["task_id"] for task in body["data"]] == [mine]
+    assert all(task["user_id"] == owner["id"] for task in body["data"])
+
+
+async def test_next_offset_pages_through_all_matches(client, user):
+    created = {await add_task(client, f"papaya {n}") for n in range(5)}
+
+    first = await search(client, q="papaya", limit=2)
+    second = await search(client, q="papaya", limit=2, offset=first["next_offset"])
+    last = await search(client, q="papaya", limit=2, offset=second["next_offset"])
+
+    assert first["next_offset"] == 2 and second["next_offset"] == 4
+    assert last["next_offset"] is None
+    pages = first["data"] + second["data"] + last["data"]
+    assert {task["task_id"] for task in pages} == created
+
+
+@pytest.mark.parametrize("query", ["   ", "\t"])
+async def test_blank_query_returns_an_empty_page(client, user, query):
+    await add_task(client, "anything")
+
+    assert await search(client, q=query) == {"data": [], "next_offset": None}
+
@@ -0,0 +1,24 @@
+import pytest
+
+from tests.test_sync import create_tasks
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_modify_moves_the_task_between_counters(client, user):
+    (task_id,) = await create_tasks(client, 1)
+    before = (await client.get("/api/tasks/stats")).json()
+
+    long_status = "s" * 255
+    response = await client.post(
+        "/api/tasks/modify",
+        json={"task_id": task_id, "status": long_status, "is_favor": True},
+    )
+    assert response.status_code == 200, response.text
+    after = (await client.get("/api/tasks/stats")).json()
+
+    assert after["favorite"] == before["favorite"] + 1
+    assert after["by_status"][long_status] == 1
+    assert sum(after["by_status"].values()) == sum(before["by_status"].values())
+    # the incremental counters agree with a full recount
+    assert after == (await client.post("/api/tasks/stats/rebuild")).json()
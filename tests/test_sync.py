@@ -0,0 +1,48 @@
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+
+async def create_tasks(client, count: int) -> list:
+    task_ids = []
+    for i in range(count):
+        response = await client.post("/api/tasks/", json={"title": f"task {i}"})
+        assert response.status_code == 200, response.text
+        task_ids.append(response.json()["task"]["task_id"])
+    return task_ids
+
+
+async def test_changes_feed_pages_through_tasks_sharing_a_timestamp(client, user):
+    # created back to back, so several land in the same second
+    task_ids = await create_tasks(client, 5)
+
+    seen, cursor = [], None
+    for _ in range(10):
+        params = {"limit": 2, **({"since": cursor} if cursor else {})}
+        response = await client.get("/api/tasks/changes", params=params)
+        assert response.status_code == 200, response.text
+        body = response.json()
+        seen += [task["task_id"] for task in body["data"]]
+        cursor = body["cursor"]
+        if not body["has_more"]:
+            break
+
+    assert sorted(seen) == sorted(task_ids)
+    assert len(seen) == len(task_ids)
+
+
+async def test_changes_feed_reports_deletions_once(client, user):
+    task_ids = await create_tasks(client, 3)
+    response = await client.get("/api/tasks/changes")
+    cursor = response.json()["cursor"]
+
+    response = await client.request(
+        "DELETE", "/api/tasks/", json={"task_id": task_ids[0]}
+    )
+    assert response.status_code == 200
+
+    body = (await client.get("/api/tasks/changes", params={"since": cursor})).json()
+    assert [tombstone["task_id"] for tombstone in body["deleted"]] == [task_ids[0]]
+
+    body = (await client.get("/api/tasks/changes", params={"since": body["cursor"]})).json()
+    assert body["deleted"] == []
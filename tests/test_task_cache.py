@@ -0,0 +1,41 @@
+import pytest
+from sqlalchemy import insert
+
+from models.model import UserTasks, db
+from models.sync import bump_collection_version
+from models.task_cache import task_list_cache
+from tests.test_sync import create_tasks
+from utility.ids import new_task_id
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_repeat_reads_are_served_from_the_cache(client, user):
+    await create_tasks(client, 2)
+    first = await client.get("/api/tasks/")
+    hits = task_list_cache.hits
+
+    second = await client.get("/api/tasks/")
+
+    assert second.content == first.content
+    assert task_list_cache.hits == hits + 1
+
+
+async def test_write_from_another_worker_is_seen_immediately(client, user):
+    await create_tasks(client, 1)
+    cached = await client.get("/api/tasks/")
+    assert len(cached.json()["data"]) == 1
+
+    # what another worker's create does: nothing reaches this process's cache
+    async with db.get_db() as dbs:
+        await dbs.execute(
+            insert(UserTasks).values(
+                task_id=new_task_id(), user_id=user["id"], title="elsewhere", status="low"
+            )
+        )
+        await bump_collection_version(dbs, user["id"])
+
+    response = await client.get("/api/tasks/", headers={"If-None-Match": cached.headers["etag"]})
+
+    assert response.status_code == 200
+    assert [task["title"] for task in response.json()["data"]].count("elsewhere") == 1
@@ -0,0 +1,72 @@
+import asyncio
+import json
+
+import pytest
+
+from models import task_events as task_events_module
+from models.task_events import NOTIFY_PAYLOAD_LIMIT, TaskEventHub, _notify_payloads
+
+pytestmark = pytest.mark.anyio
+
+
+def test_one_payload_per_transaction_split_only_at_the_size_limit():
+    small = [{"type": "updated", "task_id": str(n), "user_id": 1} for n in range(3)]
+    assert [json.loads(payload) for payload in _notify_payloads(small)] == [small]
+
+    large = [{"type": "updated", "task_id": "x" * 26, "user_id": 1}] * 500
+    payloads = list(_notify_payloads(large))
+    assert len(payloads) > 1
+    assert all(len(payload.encode()) < NOTIFY_PAYLOAD_LIMIT for payload in payloads)
+    assert [event for payload in payloads for event in json.loads(payload)] == large
+
+
+async def test_listener_delivers_every_event_of_a_notification():
+    hub = TaskEventHub("postgres", 10)
+    subscription = hub.broker.subscribe(1)
+    events = [
+        {"type": "created", "task_id": "a", "user_id": 1},
+        {"type": "deleted", "task_id": "b", "user_id": 1},
+    ]
+
+    hub._on_notify(None, 0, "task_events", json.dumps(events))
+
+    assert [subscription.queue.get_nowait() for _ in events] == events
+
+
+class _DeadDriverConnection:
+    def is_closed(self):
+        return True
+
+
+class _ListenConnection:
+    def __init__(self):
+        self.invalidated = False
+        self.closed = False
+
+    async def invalidate(self):
+        self.invalidated = True
+
+    async def close(self):
+        self.closed = True
+
+
+async def test_dropped_listen_connection_is_replaced(monkeypatch):
+    monkeypatch.setattr(task_events_module, "TASK_EVENTS_PING_SECONDS", 0)
+    hub = TaskEventHub("postgres", 10)
+    dead = _ListenConnection()
+    hub._listen_conn, hub._driver_conn = dead, _DeadDriverConnection()
+    resubscribed = asyncio.Event()
+
+    async def subscribe():
+        hub._listen_conn, hub._driver_conn = _ListenConnection(), _DeadDriverConnection()
+        resubscribed.set()
+
+    monkeypatch.setattr(hub, "_subscribe", subscribe)
+    watcher = asyncio.create_task(hub._watch())
+    await asyncio.wait_for(resubscribed.wait(), 1)
+    watcher.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await watcher
+
+    assert dead.invalidated and dead.closed
+    assert hub.reconnects >= 1
@@ -0,0 +1,52 @@
+import asyncio
+
+
+class Subscription:
+    """One listener's bounded event buffer."""
+
+    def __init__(self, key, maxsize: int):
+        self.key = key
+        self.queue = asyncio.Queue(maxsize=maxsize)
+        self.dropped = 0
+
+    def put(self, event: dict):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # a slow consumer loses its backlog and is told to resync instead
+            # of letting the buffer grow without bound
+            self.dropped += self.queue.qsize()
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait({"type": "resync"})
+
+    async def get(self) -> dict:
+        return await self.queue.get()
+
+
+class InProcessBroker:
+    """Fans events out to the subscribers of a key within this process."""
+
+    def __init__(self, buffer_size: int = 100):
+        self.buffer_size = buffer_size
+        self._subscribers: dict = {}
+
+    def subscribe(self, key) -> Subscription:
+        subscription = Subscription(key, self.buffer_size)
+        self._subscribers.setdefault(key, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        subscribers = self._subscribers.get(subscription.key)
+        if subscribers is not None:
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._subscribers[subscription.key]
+
+    def deliver(self, key, event: dict):
+        for subscription in self._subscribers.get(key, ()):
+            subscription.put(event)
+
+    @property
+    def connections(self) -> int:
+        return sum(len(subscribers) for subscribers in self._subscribers.values())
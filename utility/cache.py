@@ -0,0 +1,138 @@
+import asyncio
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """Small in-process LRU cache whose entries also expire after `ttl` seconds."""
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._data[key]
+            self.misses += 1
+            return default
+
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key, value, ttl: float | None = None):
+        self._data[key] = (time.monotonic() + (ttl or self.ttl), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        entry = self._data.pop(key, None)
+        return default if entry is None else entry[1]
+
+    def clear(self):
+        self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class CacheBackend:
+    """Interface for shared caches (e.g. Redis); values are bytes-like or tuples of them."""
+
+    async def get(self, key: str):
+        raise NotImplementedError
+
+    async def set(self, key: str, value, ttl: float | None = None):
+        raise NotImplementedError
+
+    async def delete(self, key: str):
+        raise NotImplementedError
+
+
+class MemoryCacheBackend(CacheBackend):
+    """In-process backend: LRU bounded by entry count and total payload bytes."""
+
+    def __init__(self, maxsize: int = 10_000, max_bytes: int = 64 * 1024 * 1024, ttl: float = 60):
+        self.maxsize = maxsize
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._data: OrderedDict = OrderedDict()  # key -> (expires_at, value, size)
+        self.bytes = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _size(value) -> int:
+        if isinstance(value, (bytes, str)):
+            return len(value)
+        if isinstance(value, tuple):
+            return sum(len(part) for part in value if isinstance(part, (bytes, str)))
+        return 0
+
+    def _drop(self, key):
+        _, _, size = self._data.pop(key)
+        self.bytes -= size
+
+    async def get(self, key: str):
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            self._drop(key)
+            return None
+        self._data.move_to_end(key)
+        return entry[1]
+
+    async def set(self, key: str, value, ttl: float | None = None):
+        if key in self._data:
+            self._drop(key)
+        size = self._size(value)
+        self._data[key] = (time.monotonic() + (ttl or self.ttl), value, size)
+        self.bytes += size
+        while self._data and (len(self._data) > self.maxsize or self.bytes > self.max_bytes):
+            self._drop(next(iter(self._data)))
+            self.evictions += 1
+
+    async def delete(self, key: str):
+        if key in self._data:
+            self._drop(key)
+
+
+class SingleFlight:
+    """Collapses concurrent loads of the same key into one call."""
+
+    def __init__(self):
+        self._pending = {}
+        self.joined = 0
+
+    async def do(self, key, loader):
+        future = self._pending.get(key)
+        if future is not None:
+            self.joined += 1
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        self._pending[key] = future
+        try:
+            result = await loader()
+            future.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # nobody may be waiting; don't warn about an unretrieved exception
+            future.exception()
+            raise
+        finally:
+            del self._pending[key]
@@ -0,0 +1,137 @@
+import zlib
+
+try:
+    import brotli
+except ImportError:  # optional; gzip only without it
+    brotli = None
+
+
+class _Gzip:
+    encoding = "gzip"
+
+    def __init__(self, level: int):
+        # wbits 16+MAX_WBITS writes the gzip header and trailer
+        self._obj = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._obj.compress(data) + self._obj.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._obj.flush(zlib.Z_FINISH)
+
+
+class _Brotli:
+    encoding = "br"
+
+    def __init__(self, quality: int):
+        self._obj = brotli.Compressor(quality=quality)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._obj.process(data) + self._obj.flush()
+
+    def finish(self) -> bytes:
+        return self._obj.finish()
+
+
+class CompressionMiddleware:
+    """
+    ASGI middleware compressing responses of at least `minimum_size` bytes with
+    brotli (when installed and accepted) or gzip. Streamed bodies are
+    compressed chunk by chunk; Server-Sent Events and already-encoded
+    responses pass through untouched.
+    """
+
+    def __init__(
+        self,
+        app,
+        minimum_size: int = 1024,
+        gzip_level: int = 6,
+        brotli_quality: int = 4,
+        excluded_media_types: tuple = ("text/event-stream",),
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.excluded_media_types = excluded_media_types
+
+    def _codec(self, accept_encoding: str):
+        """(compressor class, level) for the best accepted encoding, or None."""
+        accepted = {part.split(";")[0].strip() for part in accept_encoding.lower().split(",")}
+        if brotli is not None and "br" in accepted:
+            return _Brotli, self.brotli_quality
+        if "gzip" in accepted:
+            return _Gzip, self.gzip_level
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        codec = self._codec(headers.get(b"accept-encoding", b"").decode("latin-1"))
+        if codec is None:
+            await self.app(scope, receive, send)
+            return
+
+        # mode: None until the first body chunk decides "pass" or "compress"
+        state = {"start": None, "mode": None, "compressor": None}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                state["start"] = message
+                return
+            if message["type"] != "http.response.body" or state["mode"] == "pass":
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+            if state["mode"] is None:
+                start = state["start"]
+                response_headers = {k.lower(): v for k, v in start["headers"]}
+                media_type = response_headers.get(b"content-type", b"").decode("latin-1")
+                if (
+                    b"content-encoding" in response_headers
+                    or media_type.split(";")[0].strip() in self.excluded_media_types
+                    or (not more_body and len(body) < self.minimum_size)
+                ):
+                    state["mode"] = "pass"
+                    await send(start)
+                    await send(message)
+                    return
+
+                state["mode"] = "compress"
+                compressor_class, level = codec
+                state["compressor"] = compressor = compressor_class(level)
+                new_headers = [
+                    (k, v)
+                    for k, v in start["headers"]
+                    if k.lower() not in (b"content-length", b"vary")
+                ]
+                vary = response_headers.get(b"vary")
+                new_headers.append((b"vary", vary + b", Accept-Encoding" if vary else b"Accept-Encoding"))
+                new_headers.append((b"content-encoding", compressor.encoding.encode()))
+
+                if not more_body:
+                    body = compressor.compress(body) + compressor.finish()
+                    new_headers.append((b"content-length", str(len(body)).encode()))
+                    await send({**start, "headers": new_headers})
+                    await send({"type": "http.response.body", "body": body})
+                    return
+
+                await send({**start, "headers": new_headers})
+
+            compressor = state["compressor"]
+            chunk = compressor.compress(body)
+            if not more_body:
+                chunk += compressor.finish()
+            await send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+
+        await self.app(scope, receive, send_wrapper)
+
+        # a response without any body message (e.g. 304) still needs its start
+        if state["mode"] is None and state["start"] is not None:
+            await send(state["start"])
@@ -0,0 +1,85 @@
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi import HTTPException
+from passlib.context import CryptContext
+
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+
+class PasswordHasher:
+    """Runs bcrypt hash/verify on a bounded thread pool instead of the event loop.
+
+    `max_workers` caps how many hashes run at once, `max_pending` caps how many
+    calls may wait for a worker; anything beyond that is rejected with a 503.
+    """
+
+    def __init__(self, context: CryptContext, max_workers: int, max_pending: int):
+        self.context = context
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="pwd-hash"
+        )
+        self._in_flight = 0
+        self.stats = {
+            "calls": 0,
+            "rejected": 0,
+            "rehashed": 0,
+            "total_seconds": 0.0,
+            "max_seconds": 0.0,
+        }
+
+    async def _run(self, fn, *args):
+        if self._in_flight >= self.max_workers + self.max_pending:
+            self.stats["rejected"] += 1
+            raise HTTPException(
+                status_code=503,
+                detail="Server busy, please retry shortly",
+                headers={"Retry-After": "1"},
+            )
+
+        self._in_flight += 1
+        start = time.perf_counter()
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, fn, *args)
+        finally:
+            self._in_flight -= 1
+            elapsed = time.perf_counter() - start
+            self.stats["calls"] += 1
+            self.stats["total_seconds"] += elapsed
+            self.stats["max_seconds"] = max(self.stats["max_seconds"], elapsed)
+
+    async def hash(self, password: str) -> str:
+        return await self._run(self.context.hash, password)
+
+    async def verify(self, password: str, hashed: str) -> tuple[bool, str | None]:
+        """Returns (valid, new_hash); new_hash is set when the stored hash is deprecated."""
+        valid, new_hash = await self._run(
+            self.context.verify_and_update, password, hashed
+        )
+        if valid and new_hash:
+            self.stats["rehashed"] += 1
+        return valid, new_hash
+
+    def snapshot(self) -> dict:
+        calls = self.stats["calls"]
+        return {
+            **self.stats,
+            "in_flight": self._in_flight,
+            "avg_seconds": self.stats["total_seconds"] / calls if calls else 0.0,
+        }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+hasher = PasswordHasher(
+    pwd_context,
+    max_workers=int(os.getenv("HASH_MAX_WORKERS", os.cpu_count() or 1)),
+    max_pending=int(os.getenv("HASH_MAX_PENDING", "64")),
+)
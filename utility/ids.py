@@ -0,0 +1,24 @@
+import os
+import time
+
+
+_CROCKFORD = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+ULID_LENGTH = 26
+
+
+def new_ulid() -> str:
+    """
+    26-char ULID: 48-bit millisecond timestamp + 80 random bits, Crockford base32.
+    Sorts by creation time, so new rows land at the right edge of a B-tree
+    index instead of on random pages.
+    """
+    value = (time.time_ns() // 1_000_000) << 80 | int.from_bytes(os.urandom(10), "big")
+    chars = []
+    for _ in range(ULID_LENGTH):
+        chars.append(_CROCKFORD[value & 31])
+        value >>= 5
+    return "".join(reversed(chars))
+
+
+def new_task_id() -> str:
+    return new_ulid()
@@ -0,0 +1,218 @@
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from sqlalchemy import event
+
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 50)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names, values) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: tuple = ()):
+        self.name, self.help, self.label_names = name, help, labels
+        self.values = {}
+
+    def inc(self, *labels, amount: float = 1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def samples(self):
+        for labels, value in self.values.items():
+            yield f"{self.name}{_labels(self.label_names, labels)} {value}"
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *labels, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: tuple = (), buckets=DEFAULT_BUCKETS):
+        self.name, self.help, self.label_names = name, help, labels
+        self.buckets = tuple(buckets)
+        self.values = {}
+
+    def observe(self, value: float, *labels):
+        state = self.values.get(labels)
+        if state is None:
+            # per-bucket counts (+Inf last), sum, count
+            state = self.values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        state[0][bisect_left(self.buckets, value)] += 1
+        state[1] += value
+        state[2] += 1
+
+    def samples(self):
+        names = self.label_names + ("le",)
+        for labels, (counts, total, count) in self.values.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += bucket_count
+                yield f"{self.name}_bucket{_labels(names, labels + (bound,))} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.label_names, labels)} {total}"
+            yield f"{self.name}_count{_labels(self.label_names, labels)} {count}"
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+        self.collectors = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def add_collector(self, fn):
+        """`fn()` returns an iterable of (name, kind, help, value) for stats kept elsewhere."""
+        self.collectors.append(fn)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        for collector in self.collectors:
+            for name, kind, help, value in collector():
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} {kind}")
+                lines.append(f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+REQUEST_LATENCY = registry.register(
+    Histogram("http_request_duration_seconds", "Request latency", ("method", "route"))
+)
+REQUESTS_TOTAL = registry.register(
+    Counter("http_requests_total", "Requests by status", ("method", "route", "status"))
+)
+REQUESTS_IN_FLIGHT = registry.register(
+    Gauge("http_requests_in_flight", "Requests currently being served")
+)
+REQUEST_DB_QUERIES = registry.register(
+    Histogram(
+        "http_request_db_queries",
+        "DB statements executed per request",
+        ("method", "route"),
+        buckets=QUERY_COUNT_BUCKETS,
+    )
+)
+REQUEST_DB_ROUND_TRIPS = registry.register(
+    Histogram(
+        "http_request_db_round_trips",
+        "DB round trips per request: statements plus BEGIN/COMMIT/ROLLBACK",
+        ("method", "route"),
+        buckets=QUERY_COUNT_BUCKETS,
+    )
+)
+REQUEST_DB_SECONDS = registry.register(
+    Histogram(
+        "http_request_db_seconds", "Time spent in DB statements per request", ("method", "route")
+    )
+)
+
+# {"queries": int, "round_trips": int, "seconds": float} for the request
+# being served, if any
+_request_db = ContextVar("request_db", default=None)
+
+
+def instrument_engine(engine):
+    """Counts and times every statement and transaction boundary against the current request."""
+    sync_engine = engine.sync_engine
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["query_started"].pop()
+        stats = _request_db.get()
+        if stats is not None:
+            stats["queries"] += 1
+            stats["round_trips"] += 1
+            stats["seconds"] += time.perf_counter() - started
+
+    def _transaction_round_trip(conn):
+        stats = _request_db.get()
+        # AUTOCOMMIT connections never send BEGIN/COMMIT to the server
+        if stats is not None and conn.get_execution_options().get(
+            "isolation_level"
+        ) != "AUTOCOMMIT":
+            stats["round_trips"] += 1
+
+    for name in ("begin", "commit", "rollback"):
+        event.listen(sync_engine, name, _transaction_round_trip)
+
+
+def route_template(scope) -> str:
+    """
+    The matched route's full path template, e.g. "/api/tasks/stats", or
+    "unmatched". Since FastAPI stopped copying included routers' routes into
+    the app, scope["route"].path lacks the router prefix; the prefixed template
+    is kept in FastAPI's own scope entry instead.
+    """
+    context = scope.get("fastapi", {}).get("effective_route_context")
+    path = getattr(context, "path_format", None)
+    if path is None:
+        # older FastAPI: the router stores the prefixed route copy itself
+        path = getattr(scope.get("route"), "path", None)
+    return path or "unmatched"
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency, status and DB usage per route template."""
+
+    def __init__(self, app, skip_paths: tuple = ("/metrics",)):
+        self.app = app
+        self.skip_paths = skip_paths
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.skip_paths:
+            await self.app(scope, receive, send)
+            return
+
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        stats = {"queries": 0, "round_trips": 0, "seconds": 0.0}
+        token = _request_db.set(stats)
+        REQUESTS_IN_FLIGHT.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            REQUESTS_IN_FLIGHT.dec()
+            _request_db.reset(token)
+
+            path = route_template(scope)
+            method = scope["method"]
+            REQUEST_LATENCY.observe(elapsed, method, path)
+            REQUESTS_TOTAL.inc(method, path, status["code"])
+            REQUEST_DB_QUERIES.observe(stats["queries"], method, path)
+            REQUEST_DB_ROUND_TRIPS.observe(stats["round_trips"], method, path)
+            REQUEST_DB_SECONDS.observe(stats["seconds"], method, path)
@@ -0,0 +1,17 @@
+import asyncio
+
+
+async def run_periodically(job, interval: float, description: str, initial_delay: float = 0):
+    """
+    Awaits `job()` every `interval` seconds until cancelled. A failed run is
+    logged and the job simply runs again on the next tick.
+    """
+    await asyncio.sleep(initial_delay)
+    while True:
+        try:
+            await job()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"{description} failed: {e}")
+        await asyncio.sleep(interval)
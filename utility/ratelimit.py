@@ -0,0 +1,121 @@
+import math
+import os
+import time
+from collections import OrderedDict
+
+from fastapi import HTTPException, Request
+
+from utility.metrics import Counter, registry
+
+
+RATE_LIMITED_TOTAL = registry.register(
+    Counter(
+        "rate_limited_requests_total",
+        "Requests rejected by a rate limit",
+        ("scope", "key"),
+    )
+)
+
+
+class RateLimitBackend:
+    """Interface for shared bucket stores (e.g. Redis) so all workers see one limit."""
+
+    async def take(self, key: str, rate: float, burst: int) -> float:
+        """Takes one token from `key`'s bucket; returns 0 or the seconds until one is free."""
+        raise NotImplementedError
+
+
+class MemoryRateLimitBackend(RateLimitBackend):
+    """Token buckets for this process only, LRU-bounded to `maxsize` keys."""
+
+    def __init__(self, maxsize: int = 100_000):
+        self.maxsize = maxsize
+        self._buckets: OrderedDict = OrderedDict()  # key -> (tokens, updated_at)
+
+    async def take(self, key: str, rate: float, burst: int) -> float:
+        now = time.monotonic()
+        tokens, updated_at = self._buckets.get(key, (burst, now))
+        tokens = min(burst, tokens + (now - updated_at) * rate)
+
+        if tokens >= 1:
+            self._buckets[key] = (tokens - 1, now)
+            retry_after = 0.0
+        else:
+            self._buckets[key] = (tokens, now)
+            retry_after = (1 - tokens) / rate
+
+        self._buckets.move_to_end(key)
+        while len(self._buckets) > self.maxsize:
+            # an evicted key simply starts again with a full bucket
+            self._buckets.popitem(last=False)
+        return retry_after
+
+
+class RateLimiter:
+    """Per-client-IP and per-account token buckets for one endpoint."""
+
+    def __init__(self, backend: RateLimitBackend, scope: str, per_ip: str, per_account: str):
+        self.backend = backend
+        self.scope = scope
+        self.per_ip = parse_rate(per_ip)
+        self.per_account = parse_rate(per_account)
+
+    async def check(self, request: Request, account: str | None = None):
+        """
+        Raises 429 with Retry-After once the caller's IP or `account` is over its limit.
+        The IP is request.client, which is only the real client behind a proxy
+        when uvicorn trusts its X-Forwarded-For (FORWARDED_ALLOW_IPS in start.sh);
+        otherwise every caller shares the proxy's bucket.
+        """
+        client_ip = request.client.host if request.client else "unknown"
+        await self._take("ip", client_ip, self.per_ip)
+        if account is not None:
+            await self._take("account", account.strip().lower(), self.per_account)
+
+    async def _take(self, kind: str, value: str, limit):
+        if limit is None:
+            return
+        rate, burst = limit
+        retry_after = await self.backend.take(f"{self.scope}:{kind}:{value}", rate, burst)
+        if retry_after:
+            RATE_LIMITED_TOTAL.inc(self.scope, kind)
+            raise HTTPException(
+                status_code=429,
+                detail="Too many attempts, please retry later",
+                headers={"Retry-After": str(math.ceil(retry_after))},
+            )
+
+
+def parse_rate(value: str):
+    """Parses "10/60" into (10 / 60 tokens per second, burst of 10); "" or "0" disables."""
+    if not value or value == "0":
+        return None
+    count, _, seconds = value.partition("/")
+    count = int(count)
+    return count / float(seconds or 60), count
+
+
+rate_limit_backend = MemoryRateLimitBackend(
+    maxsize=int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+)
+
+# "<count>/<seconds>" per client IP or per account; the per-IP limits assume
+# FORWARDED_ALLOW_IPS is set when running behind a load balancer
+login_limiter = RateLimiter(
+    rate_limit_backend,
+    "login",
+    per_ip=os.getenv("LOGIN_RATE_PER_IP", "20/60"),
+    per_account=os.getenv("LOGIN_RATE_PER_ACCOUNT", "5/60"),
+)
+register_limiter = RateLimiter(
+    rate_limit_backend,
+    "register",
+    per_ip=os.getenv("REGISTER_RATE_PER_IP", "5/60"),
+    per_account=os.getenv("REGISTER_RATE_PER_ACCOUNT", "3/3600"),
+)
+verify_limiter = RateLimiter(
+    rate_limit_backend,
+    "verify_email",
+    per_ip=os.getenv("VERIFY_EMAIL_RATE_PER_IP", "10/60"),
+    per_account="",
+)
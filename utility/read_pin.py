@@ -0,0 +1,70 @@
+import hashlib
+import hmac
+import time
+
+
+class PrimaryPin:
+    """
+    Read-your-writes across workers: after a write the client gets a short-lived
+    signed cookie, and whichever worker serves its next reads sends them to the
+    primary until the cookie's time is up.
+    """
+
+    def __init__(self, secret: str, ttl: float, cookie_name: str = "taskease_primary_pin"):
+        self.secret = (secret or "").encode()
+        self.ttl = ttl
+        self.cookie_name = cookie_name
+
+    def _sign(self, payload: str) -> str:
+        return hmac.new(self.secret, payload.encode(), hashlib.sha256).hexdigest()
+
+    def cookie_value(self, user_id) -> str:
+        """"<user id>.<pinned until, unix seconds>.<signature>"."""
+        payload = f"{user_id}.{int(time.time() + self.ttl)}"
+        return f"{payload}.{self._sign(payload)}"
+
+    def is_pinned(self, request, user_id) -> bool:
+        value = request.cookies.get(self.cookie_name)
+        if not value:
+            return False
+        payload, _, signature = value.rpartition(".")
+        cookie_user, _, until = payload.partition(".")
+        if cookie_user != str(user_id) or not until.isdigit():
+            return False
+        if int(until) < time.time():
+            return False
+        return hmac.compare_digest(signature, self._sign(payload))
+
+
+class PrimaryPinMiddleware:
+    """
+    ASGI middleware issuing the pin cookie for requests whose handler set
+    `request.state.pin_primary` to the writing user's id. Done here rather than
+    on the handler's Response because handlers often return their own.
+    """
+
+    def __init__(self, app, pin: PrimaryPin):
+        self.app = app
+        self.pin = pin
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                # Request.state lives in scope["state"]
+                user_id = scope.get("state", {}).get("pin_primary")
+                if user_id is not None:
+                    cookie = (
+                        f"{self.pin.cookie_name}={self.pin.cookie_value(user_id)}; "
+                        f"Max-Age={int(self.pin.ttl)}; Path=/; HttpOnly; Secure; SameSite=None"
+                    )
+                    message = {
+                        **message,
+                        "headers": [*message.get("headers", []), (b"set-cookie", cookie.encode())],
+                    }
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)